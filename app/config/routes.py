@@ -0,0 +1,43 @@
+from app.config.settings import settings
+from app.services.route_matcher import UpstreamRoute
+from app.utils.auth import revoke_on_logout
+
+# every endpoint under /api. Paths are forwarded unchanged to the service,
+# see UpstreamRoute for what each field does.
+ROUTES = [
+    # auth
+    UpstreamRoute("POST", "/auth/register", "user-service", auth="none", rate_limit="auth", body="json"),
+    UpstreamRoute("POST", "/auth/login", "user-service", auth="none", rate_limit="auth", body="json"),
+    UpstreamRoute("POST", "/auth/logout", "user-service", auth="none", rate_limit="auth", after=revoke_on_logout),
+
+    # users
+    UpstreamRoute("GET", "/users/profile", "user-service", auth="required"),
+    UpstreamRoute("PUT", "/users/profile", "user-service", auth="required", body="json", invalidates="/users/{subject}"),
+    UpstreamRoute("GET", "/users/{user_id}", "user-service", cache_ttl=settings.CACHE_TTL_USER, per_subject=True),
+
+    # trips
+    UpstreamRoute("POST", "/trips", "trip-service", auth="required", body="json"),
+    UpstreamRoute("GET", "/trips", "trip-service"),
+    UpstreamRoute("GET", "/trips/{trip_id}", "trip-service", cache_ttl=settings.CACHE_TTL_TRIP, per_subject=True),
+    UpstreamRoute("DELETE", "/trips/{trip_id}", "trip-service", auth="required", invalidates="/trips/{trip_id}"),
+    UpstreamRoute(
+        "POST", "/trips/{trip_id}/coordinates", "trip-service",
+        auth="required", rate_limit="ingest", body="stream", decompress=True,
+        invalidates="/trips/{trip_id}", ingest="buffer"
+    ),
+    # add multple coords in one request (used when stoping trip)
+    UpstreamRoute(
+        "POST", "/trips/{trip_id}/coordinates/batch", "trip-service",
+        auth="required", rate_limit="ingest", body="stream", decompress=True,
+        invalidates="/trips/{trip_id}", ingest="flush"
+    ),
+    UpstreamRoute(
+        "PUT", "/trips/{trip_id}/complete", "trip-service",
+        auth="required", body="json", invalidates="/trips/{trip_id}", ingest="flush"
+    ),
+
+    # paths
+    UpstreamRoute("POST", "/paths/manual", "path-service", auth="required", body="json"),
+    UpstreamRoute("GET", "/paths/search", "path-service", rate_limit="search", cache_ttl=settings.CACHE_TTL_PATH_SEARCH),
+    UpstreamRoute("GET", "/paths/{path_id}", "path-service", cache_ttl=settings.CACHE_TTL_PATH),
+]
@@ -1,24 +1,178 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class Settings(BaseSettings):
     APP_NAME: str = "BBP API Gateway"
     PORT: int = 8080
 
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    # share of fast successful requests that get an access log line, errors are always logged
+    LOG_SUCCESS_SAMPLE_RATE: float = 0.1
+    LOG_SLOW_REQUEST_SECONDS: float = 1.0
+    # per-phase durations (auth, rate_limit, upstream_ttfb...) in a Server-Timing response header
+    SERVER_TIMING_ENABLED: bool = False
+    # /admin endpoints (the sampling profiler) are off unless a token is set
+    ADMIN_TOKEN: Optional[str] = None
+    PROFILER_MAX_SECONDS: float = 60.0
+    PROFILER_INTERVAL: float = 0.005
+
     JWT_SECRET_KEY: str = "23qecb" #just a random fallback key
     JWT_ALGORITHM: str = "HS256"
+    # local JWKS file for asymmetric algorithms (RS256, ES256...), keys looked up by kid
+    JWT_JWKS_FILE: Optional[str] = None
+    JWT_CACHE_MAX_ENTRIES: int = 10000
+    JWT_CACHE_MAX_TTL: int = 300
+    JWT_NEGATIVE_CACHE_TTL: int = 30
 
+    # each may list several instances separated by commas
     USER_SERVICE_URL: str
     TRIP_SERVICE_URL: str
     PATH_SERVICE_URL: str
 
+    # round_robin, least_outstanding or peak_ewma; LOAD_BALANCER_STRATEGIES sets it per service
+    LOAD_BALANCER_STRATEGY: str = "round_robin"
+    LOAD_BALANCER_STRATEGIES: Dict[str, str] = {}
+    PEAK_EWMA_DECAY_SECONDS: float = 10.0
+    HEALTH_CHECK_ENABLED: bool = True
+    HEALTH_CHECK_PATH: str = "/health"
+    HEALTH_CHECK_INTERVAL: float = 10.0
+    HEALTH_CHECK_TIMEOUT: float = 2.0
+    HEALTH_CHECK_UNHEALTHY_THRESHOLD: int = 2
+    HEALTH_CHECK_HEALTHY_THRESHOLD: int = 2
+    # passive outlier ejection: consecutive failures take an instance out of rotation
+    OUTLIER_CONSECUTIVE_FAILURES: int = 5
+    OUTLIER_EJECTION_SECONDS: float = 30.0
+    OUTLIER_MAX_EJECTION_PERCENT: int = 50
+
     RATE_LIMIT_PER_MINUTE: int = 60
+    # memory (per process), shared (shared memory across local workers) or redis
+    RATE_LIMIT_STORAGE: str = "memory"
+    RATE_LIMIT_OVERRIDES: Dict[str, Dict[str, str]] = {}
+    RATE_LIMIT_API_KEYS: Dict[str, str] = {}
+    RATE_LIMIT_SWEEP_INTERVAL: int = 60
+    RATE_LIMIT_SHM_NAME: str = "bbp_gateway_rate_limit"
+    RATE_LIMIT_SHM_SLOTS: int = 65536
+    RATE_LIMIT_SHM_LOCK_FILE: str = "/tmp/bbp_gateway_rate_limit.lock"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.1
 
+    # minimum calls in the rolling window before failure/slow rates can trip it
     CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
     CIRCUIT_BREAKER_TIMEOUT: int = 60
+    CIRCUIT_BREAKER_WINDOW_SECONDS: int = 60
+    CIRCUIT_BREAKER_WINDOW_BUCKETS: int = 12
+    CIRCUIT_BREAKER_FAILURE_RATE: float = 0.5
+    CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 0.8
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS: float = 5.0
+    CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS: int = 3
+    CIRCUIT_BREAKER_HALF_OPEN_SUCCESSES: int = 2
+    # per-service overrides keyed by service name, e.g. {"trip-service": {"failure_rate": 0.3}}
+    CIRCUIT_BREAKER_OVERRIDES: Dict[str, Dict[str, Any]] = {}
 
     SERVICE_REQUEST_TIMEOUT: int = 30
 
+    # retries and hedging cover idempotent methods with a replayable body;
+    # RETRY_OVERRIDES is keyed by service name like CIRCUIT_BREAKER_OVERRIDES
+    RETRY_MAX_ATTEMPTS: int = 3
+    RETRY_BACKOFF_BASE: float = 0.05
+    RETRY_BACKOFF_MAX: float = 1.0
+    RETRY_STATUS_CODES: List[int] = [502, 503, 504]
+    # per service token bucket: each call adds RATIO tokens, each retry or hedge costs one
+    RETRY_BUDGET_RATIO: float = 0.2
+    RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+    RETRY_BUDGET_MAX_TOKENS: float = 10.0
+    # a duplicate GET goes to another instance once the first is slower than this percentile
+    HEDGE_ENABLED: bool = True
+    HEDGE_PERCENTILE: float = 0.95
+    HEDGE_MIN_DELAY: float = 0.05
+    HEDGE_MIN_SAMPLES: int = 50
+    RETRY_OVERRIDES: Dict[str, Dict[str, Any]] = {}
+    # adaptive limit on calls in flight per service ("gradient" or "aimd"), with a
+    # bounded queue served by priority (lower first, keyed by rate-limit class);
+    # calls that don't fit get a 503 with Retry-After. CONCURRENCY_OVERRIDES is
+    # keyed by service name like CIRCUIT_BREAKER_OVERRIDES
+    CONCURRENCY_LIMIT_ENABLED: bool = True
+    CONCURRENCY_LIMIT_ALGORITHM: str = "gradient"
+    CONCURRENCY_INITIAL_LIMIT: int = 20
+    CONCURRENCY_MIN_LIMIT: int = 2
+    CONCURRENCY_MAX_LIMIT: int = 100
+    CONCURRENCY_QUEUE_SIZE: int = 100
+    CONCURRENCY_QUEUE_TIMEOUT: float = 1.0
+    CONCURRENCY_BACKOFF_RATIO: float = 0.9
+    CONCURRENCY_SMOOTHING: float = 0.2
+    CONCURRENCY_RTT_TOLERANCE: float = 1.5
+    CONCURRENCY_RETRY_AFTER: int = 1
+    CONCURRENCY_PRIORITIES: Dict[str, int] = {"auth": 0, "default": 1, "ingest": 1, "search": 2}
+    CONCURRENCY_OVERRIDES: Dict[str, Dict[str, Any]] = {}
+    # remaining time budget sent to upstreams; a smaller value from the client is honored
+    DEADLINE_HEADER: str = "X-Request-Timeout-Ms"
+
+    # per-upstream connection pools, SERVICE_POOL_OVERRIDES is JSON keyed by
+    # service name, e.g. {"trip-service": {"max_connections": 50, "http2": true}}
+    POOL_MAX_CONNECTIONS: int = 100
+    POOL_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    POOL_KEEPALIVE_EXPIRY: float = 30.0
+    POOL_CONNECT_TIMEOUT: float = 5.0
+    POOL_READ_TIMEOUT: Optional[float] = None
+    POOL_WRITE_TIMEOUT: Optional[float] = None
+    POOL_ACQUIRE_TIMEOUT: float = 5.0
+    POOL_HTTP2: bool = False
+    SERVICE_POOL_OVERRIDES: Dict[str, Dict[str, Any]] = {}
+
+    # /api/batch: sub-requests per call, how many run at once, default deadline of each
+    BATCH_MAX_REQUESTS: int = 20
+    BATCH_CONCURRENCY: int = 6
+    BATCH_TIMEOUT: float = 10.0
+
+    # auto (orjson, then msgspec if installed, else stdlib), orjson, msgspec or stdlib
+    JSON_CODEC: str = "auto"
+
+    # responses: zstd or br when installed, else gzip; COMPRESSION_LEVELS overrides
+    # the level per encoding, e.g. {"gzip": 6}. Entries ending in "/" match a family.
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_TYPES: List[str] = ["application/json", "application/x-ndjson", "text/"]
+    COMPRESSION_LEVELS: Dict[str, int] = {}
+    # bodies (or chunks) at least this big are (de)compressed on a worker thread
+    COMPRESSION_THREAD_THRESHOLD: int = 262144
+
+    PROXY_STREAM_CHUNK_SIZE: int = 65536
+    MAX_REQUEST_BODY_SIZE: int = 10485760
+
+    # local worker processes (app/server.py). WEB_CONCURRENCY=0 sizes them to the
+    # usable CPUs; SHARED_STATE shares circuit states, cache invalidations and logout
+    # revocations between them through shared memory (the launcher turns it on with
+    # more than one worker)
+    WEB_CONCURRENCY: int = 0
+    WORKER_GRACEFUL_TIMEOUT: float = 30.0
+    SHARED_STATE: bool = False
+    SHARED_STATE_LOCK_FILE: str = "/tmp/bbp_gateway_state.lock"
+    CIRCUIT_BREAKER_SHM_NAME: str = "bbp_gateway_circuits"
+    CIRCUIT_BREAKER_SHM_SLOTS: int = 256
+    CACHE_INVALIDATION_SHM_NAME: str = "bbp_gateway_invalidations"
+    CACHE_INVALIDATION_SHM_SLOTS: int = 4096
+    JWT_REVOCATION_SHM_NAME: str = "bbp_gateway_revocations"
+    JWT_REVOCATION_SHM_SLOTS: int = 16384
+
+    # single coordinate posts are acknowledged at once and sent to trip-service in
+    # per-trip batches of up to COORDINATE_BATCH_SIZE points, at most
+    # COORDINATE_BATCH_WINDOW seconds after the first one
+    COORDINATE_BUFFER_ENABLED: bool = False
+    COORDINATE_BATCH_SIZE: int = 100
+    COORDINATE_BATCH_WINDOW: float = 5.0
+    COORDINATE_BUFFER_MAX_POINTS: int = 50000
+    COORDINATE_FLUSH_RETRIES: int = 3
+
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_BYTES: int = 67108864
+    CACHE_MAX_ENTRY_BYTES: int = 1048576
+    CACHE_TTL_PATH: int = 300
+    CACHE_TTL_PATH_SEARCH: int = 30
+    CACHE_TTL_USER: int = 60
+    CACHE_TTL_TRIP: int = 15
+    SINGLE_FLIGHT_ENABLED: bool = True
+
     class Config:
         env_file = ".env"
         case_sensitive = True
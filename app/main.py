@@ -1,22 +1,28 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.config.settings import settings
+from app.middleware.access_log import AccessLogMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.metrics import MetricsMiddleware
 from app.middleware.rate_limit import limiter
-from app.routes import health, auth_routes, user_routes, trip_routes, path_routes
+from app.routes import admin, health, metrics, batch, gateway
+from app.services.coordinate_buffer import coordinate_buffer
+from app.services.load_balancer import load_balancer
 from app.services.proxy import proxy
+from app.utils.codec import CodecJSONResponse
+from app.utils.logger import get_logger, setup_logging, shutdown_logging
+
+setup_logging()
+logger = get_logger("app")
 
 app = FastAPI(
     title=settings.APP_NAME,
     description="API Gateway for BBP Microservices",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=CodecJSONResponse
 )
 
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -28,23 +34,47 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AccessLogMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    headers = getattr(exc, "headers", None)
+    if exc.status_code in (204, 304):
+        return Response(status_code=exc.status_code, headers=headers)
+    return CodecJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=headers)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    logger.error("unhandled error", exc_info=exc, extra={"method": request.method, "route": request.url.path})
+    return CodecJSONResponse(
         status_code=500,
         content={"detail": "Internal server error"}
     )
 
 app.include_router(health.router)
-app.include_router(auth_routes.router, prefix="/api")
-app.include_router(user_routes.router, prefix="/api")
-app.include_router(trip_routes.router, prefix="/api")
-app.include_router(path_routes.router, prefix="/api")
+app.include_router(metrics.router)
+app.include_router(admin.router)
+# before the gateway catch-all, which would otherwise claim /api/batch
+app.include_router(batch.router)
+app.include_router(gateway.router)
+
+@app.on_event("startup")
+async def startup_event():
+    if settings.COORDINATE_BUFFER_ENABLED and settings.SHARED_STATE:
+        # set for multi-worker runs; the buffer is per process and would split a trip across workers
+        raise RuntimeError("COORDINATE_BUFFER_ENABLED can't be used with more than one worker")
+    load_balancer.start_health_checks(proxy.get_client)
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await load_balancer.stop_health_checks()
+    # before the upstream clients go away
+    await coordinate_buffer.close()
     await proxy.close()
+    await limiter.close()
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -53,9 +83,11 @@ async def root():
         "status": "running",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "auth": "/api/auth (register, login, logout)",
             "users": "/api/users (profile, {user_id})",
             "trips": "/api/trips (list, create, get, coordinates, complete)",
-            "paths": "/api/paths (manual, search, {path_id})"
+            "paths": "/api/paths (manual, search, {path_id})",
+            "batch": "/api/batch (several /api requests in one call, NDJSON results)"
         }
     }
@@ -0,0 +1,54 @@
+import time
+import uuid
+from app.utils.headers import message_headers
+from app.utils.logger import log_access, request_id
+from app.utils.metrics import request_timing
+
+class AccessLogMiddleware:
+    """
+    Assigns each request an id (the client's X-Request-ID if it sent one),
+    returns it in the response and writes the structured access log line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                rid = value.decode("latin-1")[:128]
+                break
+        if not rid:
+            rid = uuid.uuid4().hex
+        token = request_id.set(rid)
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message_headers(message).append((b"x-request-id", rid.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            timing = request_timing.get()
+            route = scope.get("route")
+            log_access(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                path=scope["path"],
+                status=status[0],
+                duration=time.perf_counter() - started,
+                upstream=timing.upstream if timing else None,
+                upstream_duration=timing.upstream_seconds if timing else 0.0,
+                phases_ms={k: round(v * 1000, 3) for k, v in timing.phases.items()} if timing else None
+            )
+            request_id.reset(token)
@@ -0,0 +1,108 @@
+from starlette.datastructures import MutableHeaders
+from app.config.settings import settings
+from app.utils.headers import message_headers
+from app.utils.compression import StreamCompressor, compress_async, compressible, mark_encoded, negotiate
+from app.utils.metrics import timed
+
+
+def _vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if vary is None:
+        headers["vary"] = "Accept-Encoding"
+    elif vary.strip() != "*" and "accept-encoding" not in vary.lower():
+        headers["vary"] = vary + ", Accept-Encoding"
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing responses with the best encoding the
+    client accepts (zstd, br, gzip).
+
+    Only COMPRESSION_TYPES bodies of at least COMPRESSION_MIN_SIZE bytes are
+    compressed. Responses that already carry a Content-Encoding, such as an
+    upstream's compressed body relayed as-is, go out untouched. Buffered
+    bodies are compressed in one go, streamed ones chunk by chunk, and large
+    ones on a worker thread so the event loop keeps serving other requests.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = negotiate(value.decode("latin-1"))
+                break
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message_headers(message))
+                if message["status"] in (204, 304) or not compressible(headers.get("content-type")):
+                    passthrough = True
+                    await send(message)
+                    return
+                _vary(headers)
+                if (
+                    encoding is None
+                    or scope["method"] == "HEAD"
+                    or "content-encoding" in headers
+                    or "no-transform" in headers.get("cache-control", "")
+                    or int(headers.get("content-length") or settings.COMPRESSION_MIN_SIZE) < settings.COMPRESSION_MIN_SIZE
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                # held back until the first body chunk shows how big the body is
+                start = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body:
+                    if len(body) < settings.COMPRESSION_MIN_SIZE:
+                        passthrough = True
+                        await send(start)
+                        await send(message)
+                        return
+                    with timed("compress"):
+                        body = await compress_async(body, encoding)
+                    mark_encoded(headers, encoding)
+                    headers["content-length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                compressor = StreamCompressor(encoding)
+                mark_encoded(headers, encoding)
+                if "content-length" in headers:
+                    del headers["content-length"]
+                await send(start)
+                start = None
+
+            with timed("compress"):
+                data = await compressor.compress(body) if body else b""
+                if not more_body:
+                    data += compressor.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,61 @@
+import time
+from app.config.settings import settings
+from app.utils.headers import message_headers
+from app.utils.metrics import (
+    GATEWAY_OVERHEAD,
+    IN_FLIGHT,
+    PHASE_DURATION,
+    REQUEST_DURATION,
+    REQUESTS,
+    RequestTiming,
+    request_timing,
+)
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route request counts and latency.
+
+    Gateway overhead is the time until the response starts minus whatever
+    the proxy spent waiting on upstreams, which it adds to the request's
+    RequestTiming along with the other pipeline phases. With
+    SERVER_TIMING_ENABLED the phases are also sent in a Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+        started = time.perf_counter()
+        response_start = [500, started]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response_start[0] = message["status"]
+                response_start[1] = time.perf_counter()
+                if settings.SERVER_TIMING_ENABLED:
+                    value = timing.server_timing(response_start[1] - started)
+                    message_headers(message).append((b"server-timing", value.encode("latin-1")))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finished = time.perf_counter()
+            IN_FLIGHT.dec()
+            request_timing.reset(token)
+
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUESTS.inc(route_path, method, str(response_start[0]))
+            REQUEST_DURATION.observe(finished - started, route_path, method)
+            GATEWAY_OVERHEAD.observe(max(0.0, response_start[1] - started - timing.upstream_seconds), route_path, method)
+            for phase, seconds in timing.phases.items():
+                PHASE_DURATION.observe(seconds, route_path, phase)
@@ -1,11 +1,170 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+import hashlib
+import math
+from fastapi import HTTPException, Request
+from jose import JWTError
+from typing import Dict, Optional, Tuple
 from app.config.settings import settings
+from app.middleware.rate_limit_storage import (
+    MemoryStorage,
+    RateLimitStorage,
+    RedisStorage,
+    SharedMemoryStorage,
+)
+from app.utils.auth import token_verifier
 
-def get_rate_limit_key(request):
-    return get_remote_address(request)
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
 
-limiter = Limiter(
-    key_func=get_rate_limit_key,
-    default_limits=[f"{settings.RATE_LIMIT_PER_MINUTE}/minute"]
-)
+PER_MINUTE = settings.RATE_LIMIT_PER_MINUTE
+
+# every limit lives here: route class -> caller tier -> "<count>/<period>".
+# Tiers are "anonymous" (keyed by IP), "user" (JWT subject, or the token's
+# "tier" claim if listed) and whatever RATE_LIMIT_API_KEYS maps keys to.
+# RATE_LIMIT_OVERRIDES can replace any cell from the environment.
+RATE_LIMITS: Dict[str, Dict[str, str]] = {
+    "default": {
+        "anonymous": f"{PER_MINUTE}/minute",
+        "user": f"{PER_MINUTE}/minute",
+        "api_key": f"{PER_MINUTE * 10}/minute",
+    },
+    "auth": {
+        "anonymous": f"{PER_MINUTE}/minute",
+        "user": f"{PER_MINUTE}/minute",
+        "api_key": f"{PER_MINUTE * 10}/minute",
+    },
+    "search": {
+        "anonymous": f"{PER_MINUTE}/minute",
+        "user": f"{PER_MINUTE}/minute",
+        "api_key": f"{PER_MINUTE * 10}/minute",
+    },
+    # one /api/batch call, whatever the number of sub-requests
+    "batch": {
+        "anonymous": f"{PER_MINUTE}/minute",
+        "user": f"{PER_MINUTE}/minute",
+        "api_key": f"{PER_MINUTE * 10}/minute",
+    },
+    # phones post a GPS fix about once a second while riding
+    "ingest": {
+        "anonymous": f"{PER_MINUTE}/minute",
+        "user": f"{PER_MINUTE * 4}/minute",
+        "api_key": f"{PER_MINUTE * 10}/minute",
+    },
+}
+
+class RateLimit:
+    """`limit` requests per `period` seconds, as GCRA emission interval + burst tolerance."""
+
+    __slots__ = ("limit", "period", "interval", "tolerance", "policy")
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.interval = period / limit
+        self.tolerance = period
+        self.policy = f"{limit};w={int(period)}"
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimit":
+        count, _, unit = spec.partition("/")
+        unit = unit.strip().lower().rstrip("s")
+        if unit not in PERIODS:
+            raise ValueError(f"Unknown rate limit period in {spec!r}")
+        return cls(int(count), PERIODS[unit])
+
+
+def create_storage() -> RateLimitStorage:
+    if settings.RATE_LIMIT_STORAGE == "shared":
+        return SharedMemoryStorage(
+            settings.RATE_LIMIT_SHM_NAME,
+            settings.RATE_LIMIT_SHM_SLOTS,
+            settings.RATE_LIMIT_SHM_LOCK_FILE
+        )
+    if settings.RATE_LIMIT_STORAGE == "redis":
+        return RedisStorage(
+            settings.RATE_LIMIT_REDIS_URL,
+            "bbp:rl:",
+            settings.RATE_LIMIT_REDIS_TIMEOUT
+        )
+    return MemoryStorage(settings.RATE_LIMIT_SWEEP_INTERVAL)
+
+
+def resolve_caller(request: Request, token_payload: Optional[dict] = None) -> Tuple[str, str]:
+    """(tier, identity) for a request: known API key, then JWT subject, then client IP."""
+    api_key = request.headers.get("x-api-key")
+    if api_key and api_key in settings.RATE_LIMIT_API_KEYS:
+        return settings.RATE_LIMIT_API_KEYS[api_key], "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    if token_payload is None:
+        authorization = request.headers.get("authorization", "")
+        if authorization[:7].lower() == "bearer ":
+            try:
+                token_payload = token_verifier.decode(authorization[7:].strip())
+            except JWTError:
+                token_payload = None
+
+    subject = (token_payload or {}).get("sub") or (token_payload or {}).get("user_id")
+    if subject:
+        return token_payload.get("tier") or "user", f"sub:{subject}"
+
+    return "anonymous", "ip:" + (request.client.host if request.client else "unknown")
+
+
+class RateLimiter:
+    def __init__(self, storage: RateLimitStorage):
+        self.storage = storage
+        self.limits: Dict[Tuple[str, str], RateLimit] = {}
+        self.rejected: Dict[str, int] = {}
+
+        table = {route_class: dict(tiers) for route_class, tiers in RATE_LIMITS.items()}
+        for route_class, tiers in settings.RATE_LIMIT_OVERRIDES.items():
+            table.setdefault(route_class, {}).update(tiers)
+        for route_class, tiers in table.items():
+            for tier, spec in tiers.items():
+                self.limits[(route_class, tier)] = RateLimit.parse(spec)
+
+    def _limit_for(self, route_class: str, tier: str) -> RateLimit:
+        limit = self.limits.get((route_class, tier))
+        if limit is None:
+            # unknown route classes use "default", unknown tiers (e.g. a custom
+            # token claim) are treated like plain users
+            fallback_tier = "anonymous" if tier == "anonymous" else "user"
+            limit = (
+                self.limits.get(("default", tier))
+                or self.limits.get((route_class, fallback_tier))
+                or self.limits[("default", fallback_tier)]
+            )
+            self.limits[(route_class, tier)] = limit
+        return limit
+
+    async def check(self, request: Request, route_class: str = "default", token_payload: Optional[dict] = None) -> Dict[str, str]:
+        """Consume one request from the caller's budget, returning RateLimit-* headers or raising 429."""
+        tier, identity = resolve_caller(request, token_payload)
+        limit = self._limit_for(route_class, tier)
+
+        allowed, offset = await self.storage.acquire(f"{route_class}:{identity}", limit.interval, limit.tolerance)
+
+        if not allowed:
+            self.rejected[route_class] = self.rejected.get(route_class, 0) + 1
+            retry_after = max(1, math.ceil(offset + limit.interval - limit.tolerance))
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={
+                    "RateLimit-Policy": limit.policy,
+                    "RateLimit-Limit": str(limit.limit),
+                    "RateLimit-Remaining": "0",
+                    "RateLimit-Reset": str(retry_after),
+                    "Retry-After": str(retry_after),
+                }
+            )
+
+        return {
+            "RateLimit-Policy": limit.policy,
+            "RateLimit-Limit": str(limit.limit),
+            "RateLimit-Remaining": str(max(0, int((limit.tolerance - offset) / limit.interval))),
+            "RateLimit-Reset": str(math.ceil(offset)),
+        }
+
+    async def close(self):
+        await self.storage.close()
+
+limiter = RateLimiter(create_storage())
@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import struct
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from app.utils.logger import get_logger
+from app.utils.shared_state import FileLock, attach_segment, hash_key
+
+logger = get_logger("rate_limit")
+
+# GCRA state is a single "theoretical arrival time" (TAT) per key. Every
+# backend applies the same rule atomically and reports the TAT relative to
+# its own clock, so callers never need to compare clocks across processes.
+#
+#   tat = max(stored, now); new_tat = tat + interval
+#   allowed if new_tat - now <= tolerance, then stored = new_tat
+
+
+class RateLimitStorage(ABC):
+    @abstractmethod
+    async def acquire(self, key: str, interval: float, tolerance: float) -> Tuple[bool, float]:
+        """
+        Apply one GCRA step for `key`.
+
+        Returns (allowed, offset) where offset is TAT - now after the step:
+        the stored new TAT when allowed, the unchanged TAT when rejected.
+        """
+
+    async def close(self):
+        pass
+
+
+def _gcra(stored_tat: Optional[float], now: float, interval: float, tolerance: float) -> Tuple[bool, float]:
+    tat = stored_tat if stored_tat is not None and stored_tat > now else now
+    new_tat = tat + interval
+    if new_tat - now > tolerance:
+        return False, tat
+    return True, new_tat
+
+
+class MemoryStorage(RateLimitStorage):
+    """Per-process dict of key -> TAT. Keys whose TAT has passed carry no state and are swept."""
+
+    def __init__(self, sweep_interval: float):
+        self.tats: Dict[str, float] = {}
+        self.sweep_interval = sweep_interval
+        self.next_sweep = time.monotonic() + sweep_interval
+
+    async def acquire(self, key: str, interval: float, tolerance: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.tats = {k: tat for k, tat in self.tats.items() if tat > now}
+            self.next_sweep = now + self.sweep_interval
+
+        allowed, tat = _gcra(self.tats.get(key), now, interval, tolerance)
+        if allowed:
+            self.tats[key] = tat
+        return allowed, tat - now
+
+
+class SharedMemoryStorage(RateLimitStorage):
+    """
+    Fixed-size open-addressing table in POSIX shared memory (see
+    app/utils/shared_state.py), shared by all workers on the host and
+    serialized with an flock on a lock file.
+
+    Each slot is (64-bit key hash, TAT). A slot whose TAT has passed is free
+    again, so expiry needs no sweep; if every probed slot is live the one
+    closest to expiring is reused. CLOCK_MONOTONIC is system-wide on Linux,
+    so TATs are comparable between processes.
+    """
+
+    SLOT = struct.Struct("<Qd")
+    MAX_PROBES = 8
+
+    def __init__(self, name: str, slots: int, lock_path: str):
+        self.slots = slots
+        self.shm = attach_segment(name, slots * self.SLOT.size)
+        self.lock = FileLock(lock_path)
+
+    async def acquire(self, key: str, interval: float, tolerance: float) -> Tuple[bool, float]:
+        key_hash = hash_key(key)
+        buf = self.shm.buf
+        slot_size = self.SLOT.size
+        start = key_hash % self.slots
+
+        with self.lock:
+            now = time.monotonic()
+            target = None
+            stored_tat = None
+            oldest_offset = None
+            oldest_tat = None
+            for probe in range(self.MAX_PROBES):
+                offset = ((start + probe) % self.slots) * slot_size
+                slot_hash, slot_tat = self.SLOT.unpack_from(buf, offset)
+                if slot_hash == key_hash:
+                    target, stored_tat = offset, slot_tat
+                    break
+                if target is None and (slot_hash == 0 or slot_tat <= now):
+                    target = offset
+                if oldest_tat is None or slot_tat < oldest_tat:
+                    oldest_offset, oldest_tat = offset, slot_tat
+            if target is None:
+                target = oldest_offset
+
+            allowed, tat = _gcra(stored_tat, now, interval, tolerance)
+            if allowed:
+                self.SLOT.pack_into(buf, target, key_hash, tat)
+            return allowed, tat - now
+
+    async def close(self):
+        self.lock.close()
+        self.shm.close()
+
+
+class RespError(Exception):
+    pass
+
+
+class RespClient:
+    """Minimal RESP2 client over one asyncio connection (no redis dependency)."""
+
+    def __init__(self, url: str, timeout: float):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.lock = asyncio.Lock()
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            if self.password:
+                await self._call("AUTH", self.password)
+            if self.db:
+                await self._call("SELECT", self.db)
+        except Exception:
+            await self._reset()
+            raise
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self) -> Any:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected RESP reply: {line!r}")
+
+    async def _call(self, *args) -> Any:
+        self.writer.write(self._encode(args))
+        await self.writer.drain()
+        return await self._read_reply()
+
+    async def execute(self, *args) -> Any:
+        async with self.lock:
+            try:
+                if self.writer is None:
+                    await asyncio.wait_for(self._connect(), self.timeout)
+                return await asyncio.wait_for(self._call(*args), self.timeout)
+            except RespError:
+                raise
+            except Exception:
+                await self._reset()
+                raise
+
+    async def _reset(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def close(self):
+        async with self.lock:
+            await self._reset()
+
+
+class RedisStorage(RateLimitStorage):
+    """
+    GCRA as a Lua script on any Redis-protocol server, using the server's
+    clock so every gateway instance agrees. Keys expire when their TAT
+    passes. If the server is unreachable requests are let through.
+    """
+
+    SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - now > tolerance then
+  return {0, tostring(tat - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(new_tat - now)}
+"""
+
+    def __init__(self, url: str, prefix: str, timeout: float):
+        self.client = RespClient(url, timeout)
+        self.prefix = prefix
+        self.sha = hashlib.sha1(self.SCRIPT.encode()).hexdigest()
+        self.next_warning = 0.0
+
+    async def acquire(self, key: str, interval: float, tolerance: float) -> Tuple[bool, float]:
+        args: List[Any] = [1, self.prefix + key, repr(interval), repr(tolerance)]
+        try:
+            try:
+                allowed, offset = await self.client.execute("EVALSHA", self.sha, *args)
+            except RespError as e:
+                if not str(e).startswith("NOSCRIPT"):
+                    raise
+                allowed, offset = await self.client.execute("EVAL", self.SCRIPT, *args)
+        except Exception as e:
+            # once every 10s is enough while the server is down
+            if time.monotonic() >= self.next_warning:
+                self.next_warning = time.monotonic() + 10
+                logger.warning("redis storage unavailable, allowing requests", extra={"error": repr(e)})
+            return True, 0.0
+        return bool(allowed), float(offset)
+
+    async def close(self):
+        await self.client.close()
@@ -0,0 +1,41 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from app.config.settings import settings
+from app.utils.profiler import folded, profiler
+
+router = APIRouter(prefix="/admin", tags=["Admin"], include_in_schema=False)
+
+
+def require_admin(request: Request):
+    if not settings.ADMIN_TOKEN:
+        # disabled: look like any other unknown path
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.post("/profile", dependencies=[Depends(require_admin)])
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    interval: Optional[float] = Query(None, gt=0),
+    format: str = Query("folded", pattern="^(folded|json)$")
+):
+    """
+    Sample where the event loop spends CPU for `seconds` and return the stacks seen.
+
+    The default "folded" output feeds straight into flamegraph.pl or
+    speedscope; "json" returns {"samples", "stacks": {stack: count}}.
+    """
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profile is already being captured")
+    seconds = min(seconds, settings.PROFILER_MAX_SECONDS)
+    try:
+        stacks = await profiler.capture(seconds, interval or settings.PROFILER_INTERVAL)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if format == "json":
+        return {"samples": sum(stacks.values()), "stacks": stacks}
+    return PlainTextResponse(folded(stacks))
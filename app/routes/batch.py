@@ -0,0 +1,182 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+from app.config.settings import settings
+from app.middleware.rate_limit import limiter
+from app.routes.gateway import API_PREFIX, route_matcher
+from app.services.cache import cache_subject, invalidation_path, response_cache
+from app.services.concurrency import request_class
+from app.services.coordinate_buffer import coordinate_buffer
+from app.services.proxy import proxy
+from app.utils import codec
+from app.utils.auth import authenticate
+from app.utils.headers import forwarded, forwarded_headers
+from app.utils.logger import get_logger
+from app.utils.metrics import timed
+from app.utils.request_body import read_json
+
+logger = get_logger("batch")
+
+router = APIRouter(prefix=API_PREFIX, tags=["Batch"])
+
+# client headers that apply to the batch call itself, not to its sub-requests
+BATCH_ONLY_HEADERS = frozenset({
+    "content-length", "content-type", "content-encoding", "transfer-encoding",
+    "if-none-match", "if-modified-since",
+})
+
+
+class SubRequest:
+    __slots__ = ("id", "method", "path", "query", "body")
+
+    def __init__(self, index: int, spec: Any):
+        if not isinstance(spec, dict) or not isinstance(spec.get("path"), str):
+            raise HTTPException(status_code=400, detail=f"Sub-request {index} needs a path")
+        self.id = str(spec.get("id", index))
+        self.method = str(spec.get("method", "GET")).upper()
+        url = urlsplit(spec["path"])
+        path = url.path
+        if path.startswith(API_PREFIX + "/"):
+            path = path[len(API_PREFIX):]
+        self.path = path
+        self.query = dict(parse_qsl(url.query))
+        self.query.update({str(k): str(v) for k, v in (spec.get("query") or {}).items()})
+        self.body = codec.dumps(spec["body"]) if "body" in spec else None
+
+
+def _line(sub_id: str, status_code: int, body: Optional[bytes] = None, is_json: bool = False, **fields: Any) -> bytes:
+    head = codec.dumps({"id": sub_id, "status": status_code, **fields})[:-1]
+    if body is None:
+        return head + b"}\n"
+    if is_json and body:
+        try:
+            codec.loads(body)
+        except ValueError:
+            pass
+        else:
+            # valid JSON from the service, spliced in as received rather than re-encoded
+            return head + b',"body":' + body + b"}\n"
+    return head + b',"body":' + codec.dumps(body.decode("utf-8", "replace")) + b"}\n"
+
+
+async def _run(sub: SubRequest, request: Request, headers: Dict[str, str], token_payload: Optional[dict], timeout: float) -> bytes:
+    route, params = route_matcher.match(sub.method, sub.path)
+    if route.after is not None:
+        raise HTTPException(status_code=400, detail="Route can't be used in a batch")
+    if route.auth == "required" and token_payload is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    # charged like the same call made directly, so a batch can't multiply a route's budget
+    await limiter.check(request, route.rate_limit, token_payload)
+    # each sub-request runs in its own task, so this doesn't leak into the others
+    request_class.set(route.rate_limit)
+
+    if route.ingest is not None and settings.COORDINATE_BUFFER_ENABLED:
+        # sub-requests go straight upstream, after whatever the trip has buffered
+        await coordinate_buffer.flush(params["trip_id"])
+
+    headers = {**headers, settings.DEADLINE_HEADER.lower(): str(int(timeout * 1000))}
+    if sub.body is not None:
+        headers["content-type"] = "application/json"
+
+    if route.cache_ttl is not None:
+        response = await response_cache.fetch(
+            ttl=route.cache_ttl,
+            service_name=route.service,
+            path=sub.path,
+            headers=headers,
+            query_params=sub.query,
+            subject=cache_subject(headers, token_payload) if route.per_subject else "",
+            per_subject=route.per_subject,
+            timeout=timeout
+        )
+    else:
+        response = await proxy.forward_request(
+            service_name=route.service,
+            path=sub.path,
+            method=route.method,
+            headers=headers,
+            query_params=sub.query,
+            parse_json=False,
+            content=sub.body if route.body is not None else None,
+            timeout=timeout
+        )
+        if route.invalidates is not None:
+            await response_cache.invalidate(invalidation_path(route.invalidates, params, token_payload))
+
+    content_type = response["headers"].get("content-type", "")
+    fields = {"cache": response["cache_status"]} if response.get("cache_status") else {}
+    return _line(sub.id, response["status_code"], response["raw_content"], "json" in content_type, **fields)
+
+
+async def _guarded(
+    sub: SubRequest,
+    semaphore: asyncio.Semaphore,
+    request: Request,
+    headers: Dict[str, str],
+    token_payload: Optional[dict],
+    timeout: float
+) -> bytes:
+    """One sub-request's result line; failures become that line's status instead of failing the batch."""
+    async with semaphore:
+        try:
+            return await asyncio.wait_for(_run(sub, request, headers, token_payload, timeout), timeout)
+        except HTTPException as e:
+            return _line(sub.id, e.status_code, error=e.detail)
+        except asyncio.TimeoutError:
+            return _line(sub.id, 504, error="Sub-request deadline exceeded")
+        except Exception as e:
+            # the stream has already started, a raise here would cut it off for every sub-request
+            logger.error("batch sub-request failed", exc_info=e, extra={"method": sub.method, "route": sub.path})
+            return _line(sub.id, 500, error="Internal server error")
+
+
+async def _stream(tasks: List[asyncio.Task]) -> AsyncIterator[bytes]:
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # client went away: stop whatever is still running
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/batch")
+async def batch(request: Request):
+    """
+    Run several /api sub-requests with one auth check.
+
+    The batch call costs one "batch" rate-limit hit and each sub-request is
+    charged to its own route's class, as if it had been sent on its own.
+
+    Body: {"requests": [{"id", "method", "path", "query", "body"}, ...], "timeout_ms": n}.
+    The response is NDJSON, one {"id", "status", "body" | "error"} line per
+    sub-request in completion order, so a failed or slow sub-request never
+    holds back or fails the others.
+    """
+    with timed("auth"):
+        token_payload = authenticate(request, "optional")
+    with timed("rate_limit"):
+        rate_limit_headers = await limiter.check(request, "batch", token_payload)
+
+    with timed("body"):
+        payload = await read_json(request)
+    specs = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(specs, list) or not specs:
+        raise HTTPException(status_code=400, detail="Body must have a non-empty 'requests' list")
+    if len(specs) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_REQUESTS} sub-requests per batch")
+    subs = [SubRequest(index, spec) for index, spec in enumerate(specs)]
+
+    timeout = settings.BATCH_TIMEOUT
+    if isinstance(payload.get("timeout_ms"), (int, float)) and payload["timeout_ms"] > 0:
+        timeout = min(timeout, payload["timeout_ms"] / 1000)
+
+    headers = {k: v for k, v in request.headers.items() if k not in BATCH_ONLY_HEADERS}
+    # copied into every sub-request's task
+    forwarded.set(forwarded_headers(request.scope))
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    tasks = [asyncio.ensure_future(_guarded(sub, semaphore, request, headers, token_payload, timeout)) for sub in subs]
+
+    return StreamingResponse(_stream(tasks), media_type="application/x-ndjson", headers=rate_limit_headers)
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Request, Response
+from typing import Dict, Optional
+from app.config.routes import ROUTES
+from app.config.settings import settings
+from app.middleware.rate_limit import limiter
+from app.services.cache import cache_subject, invalidation_path, response_cache
+from app.services.concurrency import request_class
+from app.services.coordinate_buffer import coordinate_buffer
+from app.services.proxy import proxy
+from app.services.route_matcher import RouteMatcher, UpstreamRoute
+from app.utils.auth import authenticate
+from app.utils.codec import CodecJSONResponse
+from app.utils.compression import negotiate
+from app.utils.headers import forwarded, forwarded_headers
+from app.utils.metrics import timed
+from app.utils.request_body import content_encoding, forwardable_body, read_json
+from app.utils.response_helper import create_response_from_proxy, create_streaming_response
+
+API_PREFIX = "/api"
+
+router = APIRouter(tags=["Gateway"])
+
+route_matcher = RouteMatcher(ROUTES)
+
+# every method reaches dispatch, so a 404 or 405 (and its Allow list) is the
+# route table's answer for that path rather than the catch-all's
+METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+
+
+async def forward(route: UpstreamRoute, params: Dict[str, str], request: Request, token_payload: Optional[dict]) -> Response:
+    """The forwarding pipeline shared by every table route."""
+    path = request.url.path[len(API_PREFIX):]
+    # read in place from the ASGI scope, the upstream call builds the one list it sends
+    headers = request.headers
+    query_params = dict(request.query_params)
+
+    if route.cache_ttl is not None:
+        response = await response_cache.fetch(
+            ttl=route.cache_ttl,
+            service_name=route.service,
+            path=path,
+            headers=headers,
+            query_params=query_params,
+            subject=cache_subject(headers, token_payload) if route.per_subject else "",
+            per_subject=route.per_subject,
+            timeout=route.timeout,
+            encoding=negotiate(request.headers.get("accept-encoding")) if settings.COMPRESSION_ENABLED else None
+        )
+        with timed("response"):
+            return create_response_from_proxy(response)
+
+    if route.ingest is not None and settings.COORDINATE_BUFFER_ENABLED:
+        trip_id = params["trip_id"]
+        if route.ingest == "buffer":
+            with timed("body"):
+                points = await read_json(request)
+            waiting = coordinate_buffer.add(trip_id, cache_subject(headers, token_payload), headers, points)
+            return CodecJSONResponse({"accepted": True, "buffered": waiting}, status_code=202)
+        # earlier points first: batch uploads and the completion must not overtake them
+        with timed("flush"):
+            await coordinate_buffer.flush(trip_id)
+
+    body = None
+    if route.body is not None:
+        with timed("body"):
+            body = await forwardable_body(request, validate=route.body == "json", decompress=route.decompress)
+        if route.decompress and content_encoding(request) is not None:
+            # forwarded decoded, the client's encoding and length no longer apply
+            headers = [(k, v) for k, v in headers.raw if k != b"content-encoding" and k != b"content-length"]
+
+    upstream = await proxy.stream_request(
+        service_name=route.service,
+        path=path,
+        method=route.method,
+        headers=headers,
+        query_params=query_params,
+        content=body,
+        timeout=route.timeout
+    )
+    if route.invalidates is not None:
+        await response_cache.invalidate(invalidation_path(route.invalidates, params, token_payload))
+    if route.after is not None:
+        route.after(request, upstream)
+    with timed("response"):
+        return create_streaming_response(upstream)
+
+
+@router.api_route(API_PREFIX + "/{path:path}", methods=METHODS, include_in_schema=False)
+async def dispatch(request: Request):
+    route, params = route_matcher.match(request.method, request.url.path[len(API_PREFIX):])
+    # metrics and access logs label requests by the table route
+    request.scope["route"] = route
+    request_class.set(route.rate_limit)
+    forwarded.set(forwarded_headers(request.scope))
+
+    with timed("auth"):
+        token_payload = authenticate(request, route.auth)
+    with timed("rate_limit"):
+        rate_limit_headers = await limiter.check(request, route.rate_limit, token_payload)
+    response = await forward(route, params, request, token_payload)
+    response.headers.update(rate_limit_headers)
+    return response
@@ -1,4 +1,12 @@
 from fastapi import APIRouter
+from app.services.load_balancer import load_balancer
+from app.services.proxy import proxy
+from app.services.retry import retry_policy
+from app.services.cache import response_cache
+from app.services.concurrency import concurrency_limiter
+from app.services.coordinate_buffer import coordinate_buffer
+from app.services.single_flight import single_flight
+from app.utils.auth import token_verifier
 from app.utils.circuit_breaker import circuit_breaker
 
 router = APIRouter(tags=["Health"])
@@ -9,8 +17,16 @@ async def health_check():
         "status": "healthy",
         "service": "api-gateway",
         "circuit_breakers": {
-            "user-service": circuit_breaker.get_state("user-service").value,
-            "trip-service": circuit_breaker.get_state("trip-service").value,
-            "path-service": circuit_breaker.get_state("path-service").value
-        }
+            endpoint.name: circuit_breaker.get_state(endpoint.name).value
+            for pool in load_balancer.pools.values()
+            for endpoint in pool.endpoints
+        },
+        "upstreams": load_balancer.snapshot(),
+        "retries": retry_policy.stats(),
+        "concurrency": concurrency_limiter.stats(),
+        "connection_pools": proxy.get_pool_stats(),
+        "response_cache": response_cache.stats(),
+        "request_coalescing": single_flight.stats(),
+        "coordinate_buffer": coordinate_buffer.stats(),
+        "auth": token_verifier.stats()
     }
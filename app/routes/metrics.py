@@ -0,0 +1,79 @@
+import time
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.middleware.rate_limit import limiter
+from app.services.cache import response_cache
+from app.services.load_balancer import load_balancer
+from app.services.proxy import proxy
+from app.services.retry import retry_policy
+from app.services.single_flight import single_flight
+from app.utils import logger
+from app.utils.circuit_breaker import CircuitState, circuit_breaker
+from app.utils.metrics import CIRCUIT_TRANSITIONS, registry, sample_lines
+
+router = APIRouter(tags=["Metrics"])
+
+CIRCUIT_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+circuit_breaker.subscribe(
+    lambda service_name, old_state, new_state: CIRCUIT_TRANSITIONS.inc(service_name, old_state.value, new_state.value)
+)
+
+def collect_gateway_state():
+    lines = sample_lines(
+        "gateway_circuit_breaker_state", "Circuit state per service (0 closed, 1 half-open, 2 open).", ("service",),
+        (((name,), CIRCUIT_STATE_VALUES[circuit.state]) for name, circuit in circuit_breaker.circuits.items())
+    )
+    endpoints = [endpoint for pool in load_balancer.pools.values() for endpoint in pool.endpoints]
+    lines += sample_lines(
+        "gateway_upstream_endpoint_healthy", "1 if the instance passes health checks and is not ejected.", ("service", "endpoint"),
+        (((e.service, e.url), int(e.healthy and e.ejected_until <= time.monotonic())) for e in endpoints)
+    )
+    lines += sample_lines(
+        "gateway_upstream_endpoint_outstanding", "Requests waiting on each upstream instance.", ("service", "endpoint"),
+        (((e.service, e.url), e.outstanding) for e in endpoints)
+    )
+    lines += sample_lines(
+        "gateway_rate_limit_rejections_total", "Requests rejected by the rate limiter.", ("route_class",),
+        (((route_class,), count) for route_class, count in limiter.rejected.items()), kind="counter"
+    )
+
+    pools = proxy.get_pool_stats()
+    for field in ("connections", "in_use", "idle", "waiting"):
+        lines += sample_lines(
+            f"gateway_pool_{field}", f"Upstream connection pool {field.replace('_', ' ')}.", ("service",),
+            (((service_name,), stats[field]) for service_name, stats in pools.items())
+        )
+
+    lines += sample_lines(
+        "gateway_upstream_retries_total", "Extra upstream attempts by kind (retry, hedge) and budget refusals.", ("service", "kind"),
+        (
+            ((service_name, kind), counters[kind])
+            for service_name, counters in retry_policy.counters.items()
+            for kind in ("retries", "hedges", "hedge_wins", "budget_exhausted")
+        ),
+        kind="counter"
+    )
+
+    cache_stats = response_cache.stats()
+    lines += sample_lines(
+        "gateway_cache_lookups_total", "Response cache lookups by outcome.", ("result",),
+        (((result,), cache_stats[result]) for result in ("hit", "miss", "revalidated", "bypass")), kind="counter"
+    )
+    lines += sample_lines("gateway_cache_bytes", "Bytes held by the response cache.", (), [((), cache_stats.get("bytes", 0))])
+    lines += sample_lines(
+        "gateway_coalesced_requests_total", "Requests that joined an identical in-flight upstream call.", (),
+        [((), single_flight.counters["coalesced"])], kind="counter"
+    )
+    if logger.queue_handler is not None:
+        lines += sample_lines(
+            "gateway_log_records_dropped_total", "Log records dropped because the log queue was full.", (),
+            [((), logger.queue_handler.dropped)], kind="counter"
+        )
+    return lines
+
+registry.add_collector(collect_gateway_state)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
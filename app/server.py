@@ -0,0 +1,59 @@
+"""
+Production entry point: `python -m app.server`.
+
+Runs WEB_CONCURRENCY uvicorn worker processes behind one socket, by default
+one per CPU the container may actually use. With more than one worker,
+circuit states, cache invalidations and rate-limit buckets are shared
+between them through shared memory (see app/utils/shared_state.py).
+
+`kill -HUP <pid>` reloads the workers one at a time: each new worker is
+serving before the old one stops accepting, and an old worker finishes its
+in-flight requests (up to WORKER_GRACEFUL_TIMEOUT seconds) before exiting.
+This staggered reload needs uvicorn 0.51 or later (see requirements.txt);
+older releases restart every worker at once.
+"""
+import math
+import os
+import uvicorn
+from app.config.settings import settings
+
+
+def _cgroup_cpus() -> float:
+    # cgroup v2 quota, "max 100000" when unlimited
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    return math.inf
+
+
+def worker_count() -> int:
+    if settings.WEB_CONCURRENCY > 0:
+        return settings.WEB_CONCURRENCY
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return max(1, min(cpus, math.ceil(_cgroup_cpus())))
+
+
+def main():
+    workers = worker_count()
+    if workers > 1 and settings.COORDINATE_BUFFER_ENABLED:
+        raise SystemExit("COORDINATE_BUFFER_ENABLED needs WEB_CONCURRENCY=1: the buffer is held in one worker's memory")
+    if workers > 1:
+        # read by the workers' own Settings when they import the app
+        os.environ["SHARED_STATE"] = "true"
+        if settings.RATE_LIMIT_STORAGE == "memory":
+            os.environ["RATE_LIMIT_STORAGE"] = "shared"
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=settings.PORT,
+        workers=workers,
+        timeout_graceful_shutdown=settings.WORKER_GRACEFUL_TIMEOUT
+    )
+
+
+if __name__ == "__main__":
+    main()
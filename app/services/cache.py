@@ -0,0 +1,362 @@
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Set, Tuple, Union
+from urllib.parse import quote, urlencode
+from app.config.settings import settings
+from app.services.proxy import proxy
+from app.services.single_flight import single_flight
+from app.utils.compression import compress_async, compressible, mark_encoded
+from app.utils.metrics import timed
+from app.utils.shared_state import SharedInvalidationLog
+
+# client conditional headers are answered by the gateway, never forwarded on a fill
+CONDITIONAL_HEADERS = frozenset({"if-none-match", "if-modified-since"})
+
+# rough fixed cost of an entry (objects, dict slots) on top of its bytes
+ENTRY_OVERHEAD = 256
+
+
+class CacheEntry:
+    __slots__ = ("status_code", "headers", "body", "etag", "expires_at", "size", "encoded")
+
+    def __init__(self, status_code: int, headers: Dict[str, str], body: bytes, ttl: float):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = headers.get("etag")
+        self.expires_at = time.monotonic() + ttl
+        self.size = len(body) + sum(len(k) + len(v) for k, v in headers.items()) + ENTRY_OVERHEAD
+        # compressed copies of body by content-coding, made on the first hit that asks
+        self.encoded: Dict[str, bytes] = {}
+
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class CacheBackend(ABC):
+    """
+    Storage for cached upstream responses.
+
+    The methods are async so that a shared store (e.g. Redis) can implement
+    the same interface; `path` is passed along so entries can be dropped per
+    resource without knowing their query/subject variants.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CacheEntry]: ...
+
+    @abstractmethod
+    async def set(self, key: str, path: str, entry: CacheEntry): ...
+
+    @abstractmethod
+    async def invalidate(self, path: str): ...
+
+    @abstractmethod
+    async def clear(self): ...
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU bounded by the total byte size of its entries."""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.paths: Dict[str, str] = {}
+        self.keys_by_path: Dict[str, Set[str]] = {}
+        self.current_bytes = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, path: str, entry: CacheEntry):
+        if entry.size > self.max_entry_bytes:
+            return
+
+        self._remove(key)
+        self.entries[key] = entry
+        self.paths[key] = path
+        self.keys_by_path.setdefault(path, set()).add(key)
+        self.current_bytes += entry.size
+
+        while self.current_bytes > self.max_bytes and self.entries:
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    async def invalidate(self, path: str):
+        for key in list(self.keys_by_path.get(path, ())):
+            self._remove(key)
+
+    async def clear(self):
+        self.entries.clear()
+        self.paths.clear()
+        self.keys_by_path.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.current_bytes -= entry.size
+        path = self.paths.pop(key)
+        keys = self.keys_by_path.get(path)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_path[path]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+def build_cache_key(method: str, path: str, query_params: Optional[dict] = None, subject: Optional[str] = None) -> str:
+    # every part percent-encoded, so "?", "&", "=" and "|" inside a value can't shift the boundaries
+    query = urlencode(sorted((query_params or {}).items()))
+    return f"{method.upper()} {quote(path)}?{query}|{quote(subject or '', safe='')}"
+
+
+def cache_subject(headers: dict, token_payload: Optional[dict]) -> Optional[str]:
+    """
+    Subject part of the key for per-user routes.
+
+    Returns "" for anonymous calls and None when the request carries a token
+    that didn't verify, which must bypass the cache entirely.
+    """
+    if token_payload is not None:
+        return str(token_payload.get("sub") or token_payload.get("user_id") or "")
+    has_auth = any(k.lower() == "authorization" for k in headers)
+    return None if has_auth else ""
+
+
+def invalidation_path(template: str, params: Dict[str, str], token_payload: Optional[dict]) -> str:
+    """A route's `invalidates` template filled with its path parameters and the caller's `{subject}`."""
+    subject = str(token_payload.get("sub") or token_payload.get("user_id") or "") if token_payload else ""
+    return template.format(subject=subject, **params)
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+def effective_ttl(route_ttl: float, headers: Dict[str, str], per_subject: bool) -> Optional[float]:
+    """TTL capped by the upstream Cache-Control, or None if it must not be stored."""
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "no-store" in directives:
+        return None
+    if "private" in directives and not per_subject:
+        return None
+    if "no-cache" in directives:
+        return 0
+
+    max_age = directives.get("s-maxage") or directives.get("max-age")
+    if max_age is not None:
+        try:
+            return min(route_ttl, max(int(max_age), 0))
+        except ValueError:
+            pass
+    return route_ttl
+
+
+def _opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend, invalidations: Optional[SharedInvalidationLog] = None):
+        self.backend = backend
+        # with several workers, invalidations are broadcast to their caches too
+        self.invalidations = invalidations
+        self.counters = {"hit": 0, "miss": 0, "revalidated": 0, "bypass": 0}
+
+    async def _apply_remote_invalidations(self):
+        paths = self.invalidations.poll()
+        if paths is None:
+            # lost track of what changed elsewhere: nothing cached can be trusted
+            await self.backend.clear()
+            return
+        for path in paths:
+            await self.backend.invalidate(path)
+
+    async def fetch(
+        self,
+        ttl: float,
+        service_name: str,
+        path: str,
+        headers: Optional[Mapping[str, str]] = None,
+        query_params: Optional[dict] = None,
+        subject: Optional[str] = "",
+        per_subject: bool = False,
+        timeout: Optional[float] = None,
+        encoding: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Cached GET through proxy.forward_request.
+
+        Fresh entries are served without an upstream call, stale entries with
+        an ETag are revalidated with If-None-Match. Pass per_subject=True (and
+        the caller's subject) for routes whose response depends on the user.
+        With `encoding` cached bodies are served compressed, and each entry
+        compresses once per encoding instead of once per hit.
+        """
+        headers = headers or {}
+        if per_subject and subject is None:
+            # unverified token: the response can't be shared with anyone
+            self.counters["bypass"] += 1
+            response = await proxy.forward_request(
+                service_name=service_name, path=path,
+                method="GET", headers=headers, query_params=query_params, parse_json=False, timeout=timeout
+            )
+            response["cache_status"] = "BYPASS"
+            return response
+
+        if self.invalidations is not None:
+            await self._apply_remote_invalidations()
+
+        key = build_cache_key("GET", path, query_params, subject if per_subject else None)
+        client_etag = next((v for k, v in headers.items() if k.lower() == "if-none-match"), None)
+
+        entry = None
+        if settings.CACHE_ENABLED:
+            entry = await self.backend.get(key)
+            if entry is not None and entry.is_fresh():
+                self.counters["hit"] += 1
+                return await self._from_entry(entry, "HIT", client_etag, encoding)
+
+        upstream_headers = {k: v for k, v in headers.items() if k.lower() not in CONDITIONAL_HEADERS}
+
+        async def fill():
+            return await self._fill(
+                key, ttl, per_subject, entry,
+                service_name=service_name, path=path,
+                headers=upstream_headers, query_params=query_params, timeout=timeout
+            )
+
+        if settings.SINGLE_FLIGHT_ENABLED:
+            cache_status, result = await single_flight.do(key, fill)
+        else:
+            cache_status, result = await fill()
+
+        if isinstance(result, CacheEntry):
+            return await self._from_entry(result, cache_status, client_etag, encoding)
+        # shared between coalesced callers, so hand each one its own dict
+        return {**result, "cache_status": cache_status}
+
+    async def _fill(
+        self,
+        key: str,
+        ttl: float,
+        per_subject: bool,
+        entry: Optional[CacheEntry],
+        service_name: str,
+        path: str,
+        headers: dict,
+        query_params: Optional[dict],
+        timeout: Optional[float] = None
+    ) -> Tuple[str, Union[CacheEntry, Dict[str, Any]]]:
+        """One upstream call for a key, returning the entry to serve or the uncacheable response."""
+        if entry is not None and entry.etag:
+            headers = {**headers, "If-None-Match": entry.etag}
+
+        response = await proxy.forward_request(
+            service_name=service_name, path=path,
+            method="GET", headers=headers, query_params=query_params, parse_json=False, timeout=timeout
+        )
+
+        if not settings.CACHE_ENABLED:
+            self.counters["bypass"] += 1
+            return "BYPASS", response
+
+        if response["status_code"] == 304 and entry is not None:
+            self.counters["revalidated"] += 1
+            new_ttl = effective_ttl(ttl, {**entry.headers, **response["headers"]}, per_subject)
+            if new_ttl is not None:
+                entry.expires_at = time.monotonic() + new_ttl
+                await self.backend.set(key, path, entry)
+            return "REVALIDATED", entry
+
+        self.counters["miss"] += 1
+        if response["status_code"] == 200:
+            new_ttl = effective_ttl(ttl, response["headers"], per_subject)
+            if new_ttl is not None:
+                # the body was decoded by httpx, so the stored copy is identity-encoded
+                stored_headers = {
+                    k: v for k, v in response["headers"].items()
+                    if k not in ("content-encoding", "content-length", "transfer-encoding")
+                }
+                entry = CacheEntry(200, stored_headers, response["raw_content"], new_ttl)
+                await self.backend.set(key, path, entry)
+                return "MISS", entry
+
+        return "MISS", response
+
+    async def invalidate(self, path: str):
+        await self.backend.invalidate(path)
+        if self.invalidations is not None:
+            self.invalidations.publish(path)
+
+    async def _from_entry(
+        self,
+        entry: CacheEntry,
+        cache_status: str,
+        client_etag: Optional[str],
+        encoding: Optional[str] = None
+    ) -> Dict[str, Any]:
+        # weak comparison: a compressed response carried the ETag as W/"..."
+        if client_etag is not None and entry.etag is not None and _opaque(client_etag) == _opaque(entry.etag):
+            return {
+                "status_code": 304,
+                "content": None,
+                "raw_content": b"",
+                "headers": entry.headers,
+                "cache_status": cache_status
+            }
+        body, headers = entry.body, entry.headers
+        if (
+            encoding is not None
+            and len(body) >= settings.COMPRESSION_MIN_SIZE
+            and compressible(headers.get("content-type"))
+            and "no-transform" not in headers.get("cache-control", "")
+        ):
+            if encoding not in entry.encoded:
+                with timed("compress"):
+                    entry.encoded[encoding] = await compress_async(body, encoding)
+            body, headers = entry.encoded[encoding], dict(headers)
+            mark_encoded(headers, encoding)
+        return {
+            "status_code": entry.status_code,
+            "content": None,
+            "raw_content": body,
+            "headers": headers,
+            "content_encoding": headers.get("content-encoding"),
+            "cache_status": cache_status
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, **self.backend.stats()}
+
+
+response_cache = ResponseCache(
+    MemoryCache(settings.CACHE_MAX_BYTES, settings.CACHE_MAX_ENTRY_BYTES),
+    SharedInvalidationLog(
+        settings.CACHE_INVALIDATION_SHM_NAME, settings.CACHE_INVALIDATION_SHM_SLOTS, settings.SHARED_STATE_LOCK_FILE
+    ) if settings.SHARED_STATE else None
+)
@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import itertools
+import math
+from contextvars import ContextVar
+from fastapi import HTTPException
+from typing import Any, Dict, List, Optional
+from app.config.settings import settings
+from app.utils.metrics import UPSTREAM_CONCURRENCY_LIMIT, UPSTREAM_SHED
+
+ALGORITHMS = ("gradient", "aimd")
+
+# route class (the rate-limit class) of the request being handled; ranks its upstream calls when they queue
+request_class: ContextVar[str] = ContextVar("request_class", default="default")
+
+
+class ConcurrencyConfig:
+    __slots__ = (
+        "enabled", "algorithm", "initial_limit", "min_limit", "max_limit",
+        "queue_size", "queue_timeout", "backoff_ratio", "smoothing", "tolerance", "retry_after",
+    )
+
+    def __init__(self, service_name: str):
+        self.enabled = settings.CONCURRENCY_LIMIT_ENABLED
+        self.algorithm = settings.CONCURRENCY_LIMIT_ALGORITHM
+        self.initial_limit = settings.CONCURRENCY_INITIAL_LIMIT
+        self.min_limit = settings.CONCURRENCY_MIN_LIMIT
+        self.max_limit = settings.CONCURRENCY_MAX_LIMIT
+        self.queue_size = settings.CONCURRENCY_QUEUE_SIZE
+        self.queue_timeout = settings.CONCURRENCY_QUEUE_TIMEOUT
+        self.backoff_ratio = settings.CONCURRENCY_BACKOFF_RATIO
+        self.smoothing = settings.CONCURRENCY_SMOOTHING
+        self.tolerance = settings.CONCURRENCY_RTT_TOLERANCE
+        self.retry_after = settings.CONCURRENCY_RETRY_AFTER
+        for name, value in settings.CONCURRENCY_OVERRIDES.get(service_name, {}).items():
+            setattr(self, name, value)
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f"{service_name}: unknown concurrency limit algorithm {self.algorithm!r}")
+
+
+class ServiceLimiter:
+    """
+    Adaptive cap on the calls in flight to one service, with a bounded
+    priority queue in front of it.
+
+    The limit follows the latency the service actually delivers:
+    - gradient (the default) compares each call's latency with a slow
+      moving average of past latencies, the service's unloaded baseline.
+      When calls take longer than `tolerance` times the baseline, queues
+      are building up in the service and the limit shrinks in proportion;
+      otherwise it grows by about its square root.
+    - aimd adds 1/limit per successful call and multiplies the limit by
+      `backoff_ratio` on each overload signal.
+    In both, a call that ends in a timeout, connection failure, 429 or
+    503 backs the limit off, and a limit that isn't used isn't grown.
+
+    Calls over the limit wait, most important class first (CONCURRENCY_PRIORITIES).
+    When the queue is full, a call either displaces the least important
+    waiter or is shed itself. Shed calls and waits longer than
+    `queue_timeout` get a 503 with Retry-After straight away, instead of
+    sitting in the httpx pool until the request times out.
+    """
+
+    # samples in the baseline's moving average
+    LONG_WINDOW = 600
+
+    __slots__ = ("service_name", "config", "limit", "in_flight", "queue", "sequence", "long_rtt", "counters")
+
+    def __init__(self, service_name: str, config: ConcurrencyConfig):
+        self.service_name = service_name
+        self.config = config
+        self.limit = float(config.initial_limit)
+        self.in_flight = 0
+        # heap of [priority, arrival, future, route class]
+        self.queue: List[list] = []
+        self.sequence = itertools.count()
+        self.long_rtt = 0.0
+        self.counters = {"queued": 0, "shed": 0, "timeouts": 0}
+        UPSTREAM_CONCURRENCY_LIMIT.set(service_name, value=self.limit)
+
+    def _overloaded(self, route_class: str) -> HTTPException:
+        self.counters["shed"] += 1
+        UPSTREAM_SHED.inc(self.service_name, route_class)
+        return HTTPException(
+            status_code=503,
+            detail=f"{self.service_name} service is overloaded",
+            headers={"Retry-After": str(self.config.retry_after)}
+        )
+
+    async def acquire(self, route_class: str, timeout: float):
+        """Take a slot, waiting at most `timeout`; raises a 503 when the call is shed."""
+        if self.in_flight < int(self.limit) and not self.queue:
+            self.in_flight += 1
+            return
+
+        priority = settings.CONCURRENCY_PRIORITIES.get(route_class, settings.CONCURRENCY_PRIORITIES.get("default", 1))
+        if len(self.queue) >= self.config.queue_size:
+            # waiters that timed out or were cancelled stay listed until their task resumes
+            self.queue = [entry for entry in self.queue if not entry[2].done()]
+            heapq.heapify(self.queue)
+        if len(self.queue) >= self.config.queue_size:
+            # full: a more important call takes the place of the least important, most recent waiter
+            worst = max(self.queue, key=lambda entry: (entry[0], entry[1]))
+            if worst[0] <= priority:
+                raise self._overloaded(route_class)
+            self.queue.remove(worst)
+            heapq.heapify(self.queue)
+            worst[2].set_exception(self._overloaded(worst[3]))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self.sequence), future, route_class]
+        heapq.heappush(self.queue, entry)
+        self.counters["queued"] += 1
+        try:
+            await asyncio.wait_for(future, max(0.0, timeout))
+        except asyncio.TimeoutError:
+            self._dequeue(entry)
+            self.counters["timeouts"] += 1
+            raise self._overloaded(route_class)
+        except asyncio.CancelledError:
+            self._dequeue(entry)
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # handed a slot just as the caller went away
+                self.release(None, False)
+            raise
+
+    def _dequeue(self, entry: list):
+        if entry in self.queue:
+            self.queue.remove(entry)
+            heapq.heapify(self.queue)
+
+    def release(self, rtt: Optional[float], dropped: bool):
+        """Free the slot; `rtt` is the call's latency, None when it says nothing about the service."""
+        in_flight = self.in_flight
+        self.in_flight -= 1
+        if rtt is not None or dropped:
+            self._update(rtt, dropped, in_flight)
+        while self.queue and self.in_flight < int(self.limit):
+            future = heapq.heappop(self.queue)[2]
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _update(self, rtt: Optional[float], dropped: bool, in_flight: int):
+        config = self.config
+        limit = self.limit
+        if not dropped:
+            if self.long_rtt == 0.0:
+                self.long_rtt = rtt
+            else:
+                self.long_rtt += (rtt - self.long_rtt) * 2 / (self.LONG_WINDOW + 1)
+                # load went away: let the baseline catch up with what the service delivers now
+                if self.long_rtt > 2 * rtt:
+                    self.long_rtt *= 0.95
+
+        if dropped:
+            limit *= config.backoff_ratio
+        elif in_flight * 2 < limit:
+            # the limit isn't what holds traffic back, so the sample can't justify a bigger one
+            pass
+        elif config.algorithm == "aimd":
+            limit += 1 / limit
+        else:
+            gradient = max(0.5, min(1.0, config.tolerance * self.long_rtt / max(rtt, 1e-6)))
+            target = limit * gradient + math.sqrt(limit)
+            limit = limit * (1 - config.smoothing) + target * config.smoothing
+
+        self.limit = max(float(config.min_limit), min(float(config.max_limit), limit))
+        UPSTREAM_CONCURRENCY_LIMIT.set(self.service_name, value=self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self.queue),
+            "baseline_rtt_ms": round(self.long_rtt * 1000, 3),
+        }
+
+
+class ConcurrencyLimiter:
+    def __init__(self):
+        self.services: Dict[str, Optional[ServiceLimiter]] = {}
+
+    def get(self, service_name: str) -> Optional[ServiceLimiter]:
+        """The service's limiter, None when limiting is disabled for it."""
+        if service_name not in self.services:
+            config = ConcurrencyConfig(service_name)
+            self.services[service_name] = ServiceLimiter(service_name, config) if config.enabled else None
+        return self.services[service_name]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: limiter.stats() for name, limiter in self.services.items() if limiter is not None}
+
+
+concurrency_limiter = ConcurrencyLimiter()
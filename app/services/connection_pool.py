@@ -0,0 +1,70 @@
+import importlib.util
+import httpx
+from typing import Any, Dict
+from app.config.settings import settings
+from app.utils.logger import get_logger
+
+logger = get_logger("pool")
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def pool_config(service_name: str) -> Dict[str, Any]:
+    """Pool settings for one upstream service: global defaults + SERVICE_POOL_OVERRIDES."""
+    config = {
+        "max_connections": settings.POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.POOL_MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry": settings.POOL_KEEPALIVE_EXPIRY,
+        "connect_timeout": settings.POOL_CONNECT_TIMEOUT,
+        "read_timeout": settings.POOL_READ_TIMEOUT or settings.SERVICE_REQUEST_TIMEOUT,
+        "write_timeout": settings.POOL_WRITE_TIMEOUT or settings.SERVICE_REQUEST_TIMEOUT,
+        "pool_timeout": settings.POOL_ACQUIRE_TIMEOUT,
+        "http2": settings.POOL_HTTP2,
+    }
+    config.update(settings.SERVICE_POOL_OVERRIDES.get(service_name, {}))
+    return config
+
+
+def create_client(service_name: str) -> httpx.AsyncClient:
+    config = pool_config(service_name)
+
+    http2 = bool(config["http2"])
+    if http2 and not HTTP2_AVAILABLE:
+        logger.warning("HTTP/2 requested but 'h2' is not installed, using HTTP/1.1", extra={"upstream": service_name})
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config["max_connections"],
+            max_keepalive_connections=config["max_keepalive_connections"],
+            keepalive_expiry=config["keepalive_expiry"],
+        ),
+        timeout=httpx.Timeout(
+            connect=config["connect_timeout"],
+            read=config["read_timeout"],
+            write=config["write_timeout"],
+            pool=config["pool_timeout"],
+        ),
+    )
+
+
+def pool_stats(client: httpx.AsyncClient) -> Dict[str, int]:
+    """
+    Saturation snapshot of a client's connection pool.
+
+    httpx has no public API for this, so it reads the httpcore pool and
+    reports zeros if the transport is not a standard one (e.g. in tests).
+    """
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    waiting = sum(1 for request in getattr(pool, "_requests", []) if request.is_queued())
+
+    return {
+        "connections": len(connections),
+        "in_use": len(connections) - idle,
+        "idle": idle,
+        "waiting": waiting,
+        "max_connections": getattr(pool, "_max_connections", 0) or 0,
+    }
@@ -0,0 +1,200 @@
+import asyncio
+import contextvars
+import math
+from fastapi import HTTPException
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.config.settings import settings
+from app.services.cache import response_cache
+from app.services.concurrency import request_class
+from app.services.proxy import proxy
+from app.utils import codec
+from app.utils.logger import get_logger
+
+logger = get_logger("coordinate_buffer")
+
+# only what trip-service needs to authorize the batch on the rider's behalf
+FORWARDED_HEADERS = ("authorization", "x-api-key")
+
+
+class TripBuffer:
+    __slots__ = ("trip_id", "subject", "headers", "points", "timer", "lock", "failures")
+
+    def __init__(self, trip_id: str, subject: str):
+        self.trip_id = trip_id
+        self.subject = subject
+        self.headers: Dict[str, str] = {}
+        self.points: List[Any] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # one batch in flight per trip, so points reach trip-service in the order they came in
+        self.lock = asyncio.Lock()
+        self.failures = 0
+
+
+class CoordinateBuffer:
+    """
+    Groups single GPS fixes posted to /trips/{trip_id}/coordinates and sends
+    them through /trips/{trip_id}/coordinates/batch.
+
+    A trip's points go out once `batch_size` of them are waiting or `window`
+    seconds after the first one, whichever comes first. Points are buffered
+    per (trip, rider), so a batch is always sent with the token of the rider
+    who posted it. When `max_points` are held across all trips, new posts get
+    a 503 with Retry-After until flushes catch up. A batch that fails with a
+    5xx or 429 is retried after `window`, at most `max_retries` times; one
+    rejected with another 4xx is dropped, as the single posts would have been.
+
+    The buffer lives in the worker's memory, so it needs a single worker:
+    with several, a trip's points and its completion could land on
+    different ones.
+    """
+
+    def __init__(self, batch_size: int, window: float, max_points: int, max_retries: int):
+        self.batch_size = batch_size
+        self.window = window
+        self.max_points = max_points
+        self.max_retries = max_retries
+        self.buffers: Dict[Tuple[str, str], TripBuffer] = {}
+        self.pending = 0
+        self.tasks: Set[asyncio.Task] = set()
+        self.counters = {"accepted": 0, "flushed": 0, "batches": 0, "rejected": 0, "dropped": 0}
+
+    def add(self, trip_id: str, subject: str, headers: Dict[str, str], body: Any) -> int:
+        """Queue the posted point(s); returns how many of this trip's points are waiting."""
+        points = body if isinstance(body, list) else [body]
+        if not points or not all(isinstance(point, dict) for point in points):
+            raise HTTPException(status_code=400, detail="Body must be a coordinate object or a list of them")
+        if self.pending + len(points) > self.max_points:
+            self.counters["rejected"] += len(points)
+            raise self._unavailable("Coordinate buffer is full")
+
+        key = (trip_id, subject)
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = TripBuffer(trip_id, subject)
+        # the latest token: it outlives the ones posted before it
+        buffer.headers = {name: headers[name] for name in FORWARDED_HEADERS if name in headers}
+        buffer.points.extend(points)
+        self.pending += len(points)
+        self.counters["accepted"] += len(points)
+
+        if len(buffer.points) >= self.batch_size:
+            self._spawn(buffer, drain=False)
+        else:
+            self._arm(buffer)
+        return len(buffer.points)
+
+    def _unavailable(self, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(self.window)))}
+        )
+
+    def _arm(self, buffer: TripBuffer):
+        if buffer.timer is None:
+            buffer.timer = asyncio.get_running_loop().call_later(self.window, self._spawn, buffer)
+
+    def _spawn(self, buffer: TripBuffer, drain: bool = True):
+        if buffer.timer is not None:
+            buffer.timer.cancel()
+            buffer.timer = None
+        # a fresh context: the flush must not be timed or logged as the request that triggered it
+        task = asyncio.get_running_loop().create_task(self._flush(buffer, drain), context=contextvars.Context())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _flush(self, buffer: TripBuffer, drain: bool = True) -> bool:
+        """
+        Send the trip's points in batches; without `drain`, only full ones and
+        the rest waits for the window. False when a batch was kept for a retry.
+        """
+        request_class.set("ingest")
+        async with buffer.lock:
+            while buffer.points and (drain or len(buffer.points) >= self.batch_size):
+                points = buffer.points[:self.batch_size]
+                if not await self._send(buffer, points):
+                    self._arm(buffer)
+                    return False
+                # points posted while the batch was in flight were appended behind it
+                del buffer.points[:len(points)]
+                self.pending -= len(points)
+
+            key = (buffer.trip_id, buffer.subject)
+            if buffer.points:
+                self._arm(buffer)
+            elif buffer.timer is None and self.buffers.get(key) is buffer:
+                del self.buffers[key]
+            return True
+
+    async def _send(self, buffer: TripBuffer, points: List[Any]) -> bool:
+        """True once the points are delivered or given up on, False to keep them for a retry."""
+        try:
+            response = await proxy.forward_request(
+                service_name="trip-service",
+                path=f"/trips/{buffer.trip_id}/coordinates/batch",
+                method="POST",
+                headers={**buffer.headers, "content-type": "application/json"},
+                parse_json=False,
+                content=codec.dumps({"coordinates": points})
+            )
+            status_code = response["status_code"]
+        except HTTPException as e:
+            status_code = e.status_code
+
+        if status_code < 400:
+            buffer.failures = 0
+            self.counters["flushed"] += len(points)
+            self.counters["batches"] += 1
+            await response_cache.invalidate(f"/trips/{buffer.trip_id}")
+            return True
+
+        if status_code >= 500 or status_code == 429:
+            buffer.failures += 1
+            if buffer.failures <= self.max_retries:
+                return False
+        buffer.failures = 0
+        self.counters["dropped"] += len(points)
+        logger.error("coordinate batch dropped", extra={
+            "upstream": "trip-service",
+            "trip_id": buffer.trip_id,
+            "status": status_code,
+            "points": len(points)
+        })
+        return True
+
+    async def flush(self, trip_id: str):
+        """
+        Send everything held for `trip_id` now, e.g. before the trip is completed.
+
+        Raises a 503 with Retry-After when trip-service didn't take it all, so
+        the caller's request isn't forwarded ahead of the points still held.
+        """
+        delivered = True
+        for buffer in [buffer for key, buffer in self.buffers.items() if key[0] == trip_id]:
+            if buffer.timer is not None:
+                buffer.timer.cancel()
+                buffer.timer = None
+            delivered = await self._flush(buffer) and delivered
+        if not delivered:
+            raise self._unavailable("Buffered coordinates for this trip could not be delivered yet")
+
+    async def close(self):
+        """Flush every trip, for a shutdown that doesn't lose acknowledged points."""
+        for buffer in list(self.buffers.values()):
+            if buffer.timer is not None:
+                buffer.timer.cancel()
+                buffer.timer = None
+        await asyncio.gather(*(self._flush(buffer) for buffer in list(self.buffers.values())), *self.tasks)
+        if self.pending:
+            logger.error("coordinate buffer closed with points unsent", extra={"points": self.pending})
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "pending": self.pending, "trips": len(self.buffers)}
+
+
+coordinate_buffer = CoordinateBuffer(
+    settings.COORDINATE_BATCH_SIZE,
+    settings.COORDINATE_BATCH_WINDOW,
+    settings.COORDINATE_BUFFER_MAX_POINTS,
+    settings.COORDINATE_FLUSH_RETRIES
+)
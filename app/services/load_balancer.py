@@ -0,0 +1,213 @@
+import asyncio
+import math
+import random
+import time
+import httpx
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from app.config.settings import settings
+from app.utils.circuit_breaker import circuit_breaker
+from app.utils.logger import get_logger
+
+logger = get_logger("load_balancer")
+
+STRATEGIES = ("round_robin", "least_outstanding", "peak_ewma")
+
+
+def parse_endpoints(value: str) -> List[str]:
+    """A *_SERVICE_URL setting: one base URL or several separated by commas."""
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+def service_endpoints() -> Dict[str, List[str]]:
+    return {
+        "user-service": parse_endpoints(settings.USER_SERVICE_URL),
+        "trip-service": parse_endpoints(settings.TRIP_SERVICE_URL),
+        "path-service": parse_endpoints(settings.PATH_SERVICE_URL),
+    }
+
+
+class Endpoint:
+    """
+    One instance of an upstream service.
+
+    `name` ("<service>@<url>") is also its circuit breaker key, so every
+    instance trips on its own.
+    """
+
+    __slots__ = (
+        "service", "url", "name", "outstanding", "ewma", "ewma_at",
+        "healthy", "check_failures", "check_successes",
+        "consecutive_failures", "ejected_until", "ejections",
+    )
+
+    def __init__(self, service: str, url: str):
+        self.service = service
+        self.url = url
+        self.name = f"{service}@{url}"
+        self.outstanding = 0
+        self.ewma = 0.0
+        self.ewma_at = time.monotonic()
+        self.healthy = True
+        self.check_failures = 0
+        self.check_successes = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def cost(self, now: float) -> float:
+        # peak EWMA: decayed latency estimate weighted by queue depth
+        decay = math.exp(-(now - self.ewma_at) / settings.PEAK_EWMA_DECAY_SECONDS)
+        return self.ewma * decay * (self.outstanding + 1)
+
+    def observe(self, rtt: float, now: float):
+        if rtt > self.ewma:
+            # a slow response counts in full right away, recovery is gradual
+            self.ewma = rtt
+        else:
+            weight = math.exp(-(now - self.ewma_at) / settings.PEAK_EWMA_DECAY_SECONDS)
+            self.ewma = self.ewma * weight + rtt * (1 - weight)
+        self.ewma_at = now
+
+
+class ServicePool:
+    """The endpoints of one service and the strategy choosing between them."""
+
+    def __init__(self, service: str, urls: List[str], strategy: str):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown load balancing strategy {strategy!r} for {service}")
+        if not urls:
+            raise ValueError(f"No endpoints configured for {service}")
+        self.service = service
+        self.strategy = strategy
+        self.endpoints = [Endpoint(service, url) for url in urls]
+        self.next_index = 0
+
+    def _candidates(self, now: float) -> List[Endpoint]:
+        available = [e for e in self.endpoints if circuit_breaker.is_available(e.name)]
+        preferred = [e for e in available if e.healthy and e.ejected_until <= now]
+        # if every instance looks bad, spreading load over all of them beats refusing it
+        return preferred or available
+
+    def pick(self, exclude: Sequence[Endpoint] = ()) -> Optional[Endpoint]:
+        """Choose an endpoint, avoiding `exclude` (already tried ones) unless nothing else is left."""
+        now = time.monotonic()
+        candidates = self._candidates(now)
+        if not candidates:
+            return None
+        if exclude:
+            candidates = [e for e in candidates if e not in exclude] or candidates
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if self.strategy == "round_robin":
+            endpoint = candidates[self.next_index % len(candidates)]
+            self.next_index += 1
+            return endpoint
+
+        # power of two choices: near-best balance without scanning every endpoint
+        first, second = random.sample(candidates, 2)
+        if self.strategy == "least_outstanding":
+            return first if first.outstanding <= second.outstanding else second
+        return first if first.cost(now) <= second.cost(now) else second
+
+    def _ejected_count(self, now: float) -> int:
+        return sum(1 for e in self.endpoints if e.ejected_until > now)
+
+    def record(self, endpoint: Endpoint, duration: float, failed: bool):
+        now = time.monotonic()
+        endpoint.observe(duration, now)
+        if not failed:
+            endpoint.consecutive_failures = 0
+            return
+
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures < settings.OUTLIER_CONSECUTIVE_FAILURES or endpoint.ejected_until > now:
+            return
+        max_ejected = len(self.endpoints) * settings.OUTLIER_MAX_EJECTION_PERCENT // 100
+        if self._ejected_count(now) >= max_ejected:
+            return
+
+        endpoint.ejections += 1
+        # repeat offenders stay out longer
+        seconds = min(settings.OUTLIER_EJECTION_SECONDS * endpoint.ejections, settings.OUTLIER_EJECTION_SECONDS * 10)
+        endpoint.ejected_until = now + seconds
+        endpoint.consecutive_failures = 0
+        logger.warning("endpoint ejected", extra={"upstream": endpoint.name, "seconds": seconds})
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "endpoints": {
+                e.url: {
+                    "healthy": e.healthy,
+                    "ejected": e.ejected_until > now,
+                    "outstanding": e.outstanding,
+                    "ewma_ms": round(e.ewma * 1000, 3),
+                    "circuit": circuit_breaker.get_state(e.name).value,
+                }
+                for e in self.endpoints
+            },
+        }
+
+
+class LoadBalancer:
+    def __init__(self):
+        self.pools: Dict[str, ServicePool] = {}
+        for service, urls in service_endpoints().items():
+            strategy = settings.LOAD_BALANCER_STRATEGIES.get(service, settings.LOAD_BALANCER_STRATEGY)
+            self.pools[service] = ServicePool(service, urls, strategy)
+        self.health_task: Optional[asyncio.Task] = None
+
+    def pick(self, service_name: str, exclude: Sequence[Endpoint] = ()) -> Optional[Endpoint]:
+        return self.pools[service_name].pick(exclude)
+
+    def record(self, endpoint: Endpoint, duration: float, failed: bool):
+        self.pools[endpoint.service].record(endpoint, duration, failed)
+
+    async def _check(self, client: httpx.AsyncClient, endpoint: Endpoint):
+        try:
+            response = await client.get(endpoint.url + settings.HEALTH_CHECK_PATH, timeout=settings.HEALTH_CHECK_TIMEOUT)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+
+        if ok:
+            endpoint.check_failures = 0
+            endpoint.check_successes += 1
+            if not endpoint.healthy and endpoint.check_successes >= settings.HEALTH_CHECK_HEALTHY_THRESHOLD:
+                endpoint.healthy = True
+                logger.warning("endpoint healthy", extra={"upstream": endpoint.name})
+        else:
+            endpoint.check_successes = 0
+            endpoint.check_failures += 1
+            if endpoint.healthy and endpoint.check_failures >= settings.HEALTH_CHECK_UNHEALTHY_THRESHOLD:
+                endpoint.healthy = False
+                logger.warning("endpoint unhealthy", extra={"upstream": endpoint.name})
+
+    async def _health_loop(self, get_client: Callable[[str], httpx.AsyncClient]):
+        while True:
+            await asyncio.gather(*(
+                self._check(get_client(pool.service), endpoint)
+                for pool in self.pools.values()
+                for endpoint in pool.endpoints
+            ))
+            await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+    def start_health_checks(self, get_client: Callable[[str], httpx.AsyncClient]):
+        if settings.HEALTH_CHECK_ENABLED and self.health_task is None:
+            self.health_task = asyncio.create_task(self._health_loop(get_client))
+
+    async def stop_health_checks(self):
+        if self.health_task is not None:
+            self.health_task.cancel()
+            try:
+                await self.health_task
+            except asyncio.CancelledError:
+                pass
+            self.health_task = None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {service: pool.snapshot() for service, pool in self.pools.items()}
+
+load_balancer = LoadBalancer()
@@ -1,86 +1,435 @@
+import asyncio
 import httpx
+import logging
+import time
 from fastapi import HTTPException
-from typing import Optional, Any
+from typing import Optional, Any, AsyncIterator, Awaitable, Callable, Dict, List, Union
 from app.config.settings import settings
+from app.services.concurrency import concurrency_limiter, request_class
+from app.services.connection_pool import create_client, pool_stats
+from app.services.load_balancer import Endpoint, load_balancer
+from app.services.retry import IDEMPOTENT_METHODS, SAFE_METHODS, ServiceRetry, retry_policy
+from app.utils import codec
 from app.utils.circuit_breaker import circuit_breaker
+from app.utils.headers import DEADLINE_HEADER, HeadersLike, header_value, upstream_request_headers
+from app.utils.logger import get_logger, redact_headers
+from app.utils.metrics import UPSTREAM_DURATION, UPSTREAM_IN_FLIGHT, UPSTREAM_REQUESTS, RequestTiming, request_timing, timed
+
+UPSTREAM_SERVICES = ("user-service", "trip-service", "path-service")
+
+# outcomes that mean the service is past its capacity, for the concurrency limiter
+OVERLOAD_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+logger = get_logger("proxy")
+
+
+class UpstreamTrace:
+    """
+    httpcore trace hook splitting one upstream call into phases: waiting
+    for a pooled connection, opening a new one (TCP and TLS), and time to
+    first byte (sending the request until the response headers are in).
+    """
+
+    __slots__ = ("timing", "started", "connect_started", "connect", "sent")
+
+    def __init__(self, timing: RequestTiming):
+        self.timing = timing
+        self.started = time.perf_counter()
+        self.connect_started = 0.0
+        self.connect = 0.0
+        self.sent = 0.0
+
+    async def __call__(self, event: str, info: dict):
+        now = time.perf_counter()
+        if event.endswith(("connect_tcp.started", "start_tls.started")):
+            self.connect_started = now
+        elif event.endswith(("connect_tcp.complete", "start_tls.complete")):
+            self.connect += now - self.connect_started
+        elif event.endswith("send_request_headers.started"):
+            self.sent = now
+            self.timing.add("upstream_wait", max(0.0, now - self.started - self.connect))
+            if self.connect:
+                self.timing.add("upstream_connect", self.connect)
+        elif event.endswith("receive_response_headers.complete") and self.sent:
+            self.timing.add("upstream_ttfb", now - self.sent)
+
 
 class ServiceProxy:
     def __init__(self):
-        self.client = httpx.AsyncClient(timeout=settings.SERVICE_REQUEST_TIMEOUT)
+        # one pool per upstream so a slow service can't starve the others
+        self.clients: Dict[str, httpx.AsyncClient] = {
+            service_name: create_client(service_name) for service_name in UPSTREAM_SERVICES
+        }
 
-    async def forward_request(
+    def get_client(self, service_name: str) -> httpx.AsyncClient:
+        client = self.clients.get(service_name)
+        if client is None:
+            client = self.clients[service_name] = create_client(service_name)
+        return client
+
+    def get_pool_stats(self) -> Dict[str, Dict[str, int]]:
+        return {service_name: pool_stats(client) for service_name, client in self.clients.items()}
+
+    def _record_status(self, endpoint: Endpoint, status_code: int, duration: float):
+        # only 5xx erros are actual service failures. 4xx (including 404) are valid responses
+        if status_code >= 500:
+            circuit_breaker.record_failure(endpoint.name, duration)
+            load_balancer.record(endpoint, duration, failed=True)
+        else:
+            circuit_breaker.record_success(endpoint.name, duration)
+            load_balancer.record(endpoint, duration, failed=False)
+
+    def _record_failure(self, endpoint: Endpoint, duration: float):
+        circuit_breaker.record_failure(endpoint.name, duration)
+        load_balancer.record(endpoint, duration, failed=True)
+
+    def _timeout(self, client: httpx.AsyncClient, read_timeout: Optional[float]) -> httpx.Timeout:
+        if read_timeout is None:
+            return client.timeout
+        # a per-route timeout only replaces the read timeout, connect and pool keep the service's
+        return httpx.Timeout(
+            connect=client.timeout.connect,
+            read=read_timeout,
+            write=client.timeout.write,
+            pool=client.timeout.pool
+        )
+
+    def _deadline(self, client: httpx.AsyncClient, headers: Optional[HeadersLike], timeout: Optional[float]) -> float:
+        """Seconds this call may take in total, across retries: the route timeout or a smaller client deadline."""
+        budget = timeout or client.timeout.read or settings.SERVICE_REQUEST_TIMEOUT
+        value = header_value(headers, DEADLINE_HEADER)
+        if value is not None:
+            try:
+                budget = min(budget, max(0.001, int(value) / 1000))
+            except ValueError:
+                pass
+        return budget
+
+    async def _send(
         self,
         service_name: str,
-        service_url: str,
         path: str,
         method: str,
-        headers: Optional[dict] = None,
-        body: Optional[dict] = None,
-        query_params: Optional[dict] = None
-    ):
-        if not circuit_breaker.can_execute(service_name):
+        headers: Optional[HeadersLike],
+        body: Optional[dict],
+        query_params: Optional[dict],
+        content: Optional[Union[bytes, AsyncIterator[bytes]]],
+        stream: bool,
+        timeout: Optional[float] = None
+    ) -> httpx.Response:
+        """Send within the service's adaptive concurrency limit, see ServiceLimiter."""
+        deadline = time.monotonic() + self._deadline(self.get_client(service_name), headers, timeout)
+        limiter = concurrency_limiter.get(service_name)
+        if limiter is None:
+            return await self._send_with_retries(
+                service_name, path, method, headers, body, query_params, content, stream, deadline
+            )
+
+        with timed("queue"):
+            await limiter.acquire(request_class.get(), min(limiter.config.queue_timeout, deadline - time.monotonic()))
+        started = time.monotonic()
+        rtt: Optional[float] = None
+        dropped = False
+        try:
+            response = await self._send_with_retries(
+                service_name, path, method, headers, body, query_params, content, stream, deadline
+            )
+            # for streamed responses this is the time to the headers, the body is the client's pace
+            rtt = time.monotonic() - started
+            dropped = response.status_code in OVERLOAD_STATUS_CODES
+            return response
+        except HTTPException as e:
+            if e.status_code in OVERLOAD_STATUS_CODES:
+                rtt = time.monotonic() - started
+                dropped = True
+            raise
+        finally:
+            limiter.release(rtt, dropped)
+
+    async def _send_with_retries(
+        self,
+        service_name: str,
+        path: str,
+        method: str,
+        headers: Optional[HeadersLike],
+        body: Optional[dict],
+        query_params: Optional[dict],
+        content: Optional[Union[bytes, AsyncIterator[bytes]]],
+        stream: bool,
+        deadline: float
+    ) -> httpx.Response:
+        """
+        Send with the service's retry policy.
+
+        Idempotent calls whose body can be replayed are retried on connect
+        errors and RETRY_STATUS_CODES with jittered backoff, and safe ones
+        are hedged once they run longer than the service's latency
+        percentile. Every extra attempt spends a token from the service's
+        retry budget, and none starts after the deadline.
+        """
+        state = retry_policy.get(service_name)
+        state.budget.deposit()
+        tried: List[Endpoint] = []
+
+        async def attempt() -> httpx.Response:
+            return await self._attempt(
+                service_name, path, method, headers, body, query_params, content, stream, deadline, tried
+            )
+
+        replayable = content is None or isinstance(content, bytes)
+        if method not in IDEMPOTENT_METHODS or not replayable:
+            return await attempt()
+
+        hedged = method in SAFE_METHODS
+        config = state.config
+        retries = 0
+        while True:
+            try:
+                response = await (self._hedged(service_name, state, attempt, deadline) if hedged else attempt())
+            except HTTPException as e:
+                if e.status_code not in config.status_codes or not self._may_retry(service_name, state, retries, deadline):
+                    raise
+            else:
+                if response.status_code not in config.status_codes or not self._may_retry(service_name, state, retries, deadline):
+                    return response
+                await response.aclose()
+            await asyncio.sleep(config.backoff(retries))
+            retries += 1
+
+    def _may_retry(self, service_name: str, state: ServiceRetry, retries: int, deadline: float) -> bool:
+        if retries + 1 >= state.config.max_attempts:
+            return False
+        # the worst-case backoff must still leave time for the call itself
+        if time.monotonic() + state.config.backoff_max >= deadline:
+            return False
+        if not state.budget.withdraw():
+            retry_policy.count(service_name, "budget_exhausted")
+            return False
+        retry_policy.count(service_name, "retries")
+        return True
+
+    async def _hedged(
+        self,
+        service_name: str,
+        state: ServiceRetry,
+        attempt: Callable[[], Awaitable[httpx.Response]],
+        deadline: float
+    ) -> httpx.Response:
+        """Race a second attempt against a slow first one; the first good response wins, the other is cancelled."""
+        delay = state.hedge_delay()
+        if delay is None or time.monotonic() + delay >= deadline:
+            return await attempt()
+
+        first = asyncio.ensure_future(attempt())
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done:
+            return first.result()
+        if not state.budget.withdraw():
+            retry_policy.count(service_name, "budget_exhausted")
+            return await first
+        retry_policy.count(service_name, "hedges")
+
+        hedge = asyncio.ensure_future(attempt())
+        pending = {first, hedge}
+        winner: Optional[asyncio.Future] = None
+        last: Optional[asyncio.Future] = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if winner is None and task.exception() is None and task.result().status_code not in state.config.status_codes:
+                        winner = task
+                        continue
+                    # keep only the latest failed outcome, closing any response it replaces
+                    if last is not None and last.exception() is None:
+                        await last.result().aclose()
+                    last = task
+
+            if winner is None:
+                # both failed: hand the last outcome to the retry loop
+                return last.result()
+            if last is not None and last.exception() is None:
+                await last.result().aclose()
+            if winner is hedge:
+                retry_policy.count(service_name, "hedge_wins")
+            return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in pending:
+                try:
+                    response = await task
+                except BaseException:
+                    continue
+                await response.aclose()
+
+    async def _attempt(
+        self,
+        service_name: str,
+        path: str,
+        method: str,
+        headers: Optional[HeadersLike],
+        body: Optional[dict],
+        query_params: Optional[dict],
+        content: Optional[Union[bytes, AsyncIterator[bytes]]],
+        stream: bool,
+        deadline: float,
+        tried: List[Endpoint]
+    ) -> httpx.Response:
+        """One call to one endpoint, preferring endpoints not in `tried`."""
+        endpoint = load_balancer.pick(service_name, tried)
+        if endpoint is None or not circuit_breaker.can_execute(endpoint.name):
             raise HTTPException(
                 status_code=503,
                 detail=f"{service_name} service is currently unavailable"
             )
+        tried.append(endpoint)
 
+        started = time.monotonic()
+        status = "error"
+        endpoint.outstanding += 1
+        UPSTREAM_IN_FLIGHT.inc(service_name)
         try:
-            url = f"{service_url}{path}"
-
-            filtered_headers = {
-                k: v for k, v in (headers or {}).items()
-                if k.lower() not in {'host', 'content-length'}
-            }
-
-            response = await self.client.request(
+            client = self.get_client(service_name)
+            remaining = deadline - started
+            upstream_headers = upstream_request_headers(
+                headers, content is not None and not isinstance(content, bytes), stream, max(1, int(remaining * 1000))
+            )
+            upstream_request = client.build_request(
                 method=method,
-                url=url,
-                headers=filtered_headers,
+                url=f"{endpoint.url}{path}",
+                headers=upstream_headers,
                 json=body,
-                params=query_params
+                content=content,
+                params=query_params,
+                timeout=self._timeout(client, remaining)
             )
+            timing = request_timing.get()
+            if timing is not None:
+                upstream_request.extensions["trace"] = UpstreamTrace(timing)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("upstream request", extra={
+                    "upstream": endpoint.name,
+                    "method": method,
+                    "url": str(upstream_request.url),
+                    "headers": redact_headers(dict(upstream_request.headers)),
+                })
+            response = await client.send(upstream_request, stream=stream)
 
-            content: Any = None
-            is_json = False
-            try:
-                if response.content:
-                    content = response.json()
-                    is_json = True
-            except Exception:
-                content = response.text
-
-            print(f"[CIRCUIT BREAKER DEBUG] Service: {service_name}, Status: {response.status_code}")
-
-            # only 5xx erros are actual service failures. 4xx (including 404) are valid responses
-            if response.status_code >= 500:
-                print(f"[CIRCUIT BREAKER] Recording FAILURE for {service_name} (status={response.status_code})")
-                circuit_breaker.record_failure(service_name)
-            elif 200 <= response.status_code < 500:
-                print(f"[CIRCUIT BREAKER] Recording SUCCESS for {service_name} (status={response.status_code})")
-                circuit_breaker.record_success(service_name)
-
-            return {
-                "status_code": response.status_code,
-                "content": content,
-                "headers": dict(response.headers)
-            }
+            status = str(response.status_code)
+            duration = time.monotonic() - started
+            self._record_status(endpoint, response.status_code, duration)
+            if response.status_code < 500:
+                retry_policy.get(service_name).latency.observe(duration)
+            return response
+
+        except asyncio.CancelledError:
+            # the losing side of a hedge, or the client went away
+            circuit_breaker.release(endpoint.name)
+            raise
+
+        except HTTPException:
+            # raised by the request body stream (e.g. size limit), not an upstream failure
+            circuit_breaker.release(endpoint.name)
+            raise
+
+        except httpx.PoolTimeout:
+            # our own pool is saturated, the upstream itself hasn't failed
+            circuit_breaker.release(endpoint.name)
+            raise HTTPException(status_code=503, detail=f"{service_name} service is busy")
 
         except httpx.TimeoutException:
-            circuit_breaker.record_failure(service_name)
+            self._record_failure(endpoint, time.monotonic() - started)
+            logger.warning("upstream timeout", extra={"upstream": endpoint.name, "method": method, "path": path})
             raise HTTPException(status_code=504, detail=f"{service_name} service timeout")
 
-        except httpx.RequestError:
-            circuit_breaker.record_failure(service_name)
+        except httpx.RequestError as e:
+            self._record_failure(endpoint, time.monotonic() - started)
+            logger.warning("upstream unavailable", extra={"upstream": endpoint.name, "method": method, "path": path, "error": repr(e)})
             raise HTTPException(status_code=502, detail=f"{service_name} service unavailable")
 
         except Exception:
-            circuit_breaker.record_failure(service_name)
+            self._record_failure(endpoint, time.monotonic() - started)
+            logger.exception("error forwarding request", extra={"upstream": endpoint.name, "method": method, "path": path})
             raise HTTPException(
                 status_code=500,
                 detail=f"Error communicating with {service_name} service"
             )
 
+        finally:
+            duration = time.monotonic() - started
+            endpoint.outstanding -= 1
+            UPSTREAM_IN_FLIGHT.dec(service_name)
+            UPSTREAM_REQUESTS.inc(service_name, status)
+            UPSTREAM_DURATION.observe(duration, service_name)
+            timing = request_timing.get()
+            if timing is not None:
+                timing.upstream_seconds += duration
+                timing.upstream = service_name
+
+    async def forward_request(
+        self,
+        service_name: str,
+        path: str,
+        method: str,
+        headers: Optional[HeadersLike] = None,
+        body: Optional[dict] = None,
+        query_params: Optional[dict] = None,
+        parse_json: bool = True,
+        content: Optional[Union[bytes, AsyncIterator[bytes]]] = None,
+        timeout: Optional[float] = None
+    ):
+        """Forward a request and buffer the whole upstream response.
+
+        Use this only when the gateway needs to look at the body, otherwise
+        prefer stream_request which never decodes the payload.
+        """
+        response = await self._send(
+            service_name, path, method, headers, body, query_params, content, stream=False, timeout=timeout
+        )
+
+        parsed: Any = None
+        if parse_json and response.content:
+            with timed("parse"):
+                try:
+                    parsed = codec.loads(response.content)
+                except Exception:
+                    parsed = response.text
+
+        return {
+            "status_code": response.status_code,
+            "content": parsed,
+            "raw_content": response.content,
+            # httpx's case-insensitive Headers, read in place
+            "headers": response.headers
+        }
+
+    async def stream_request(
+        self,
+        service_name: str,
+        path: str,
+        method: str,
+        headers: Optional[HeadersLike] = None,
+        body: Optional[dict] = None,
+        query_params: Optional[dict] = None,
+        content: Optional[Union[bytes, AsyncIterator[bytes]]] = None,
+        timeout: Optional[float] = None
+    ) -> httpx.Response:
+        """Forward a request and return the upstream response without reading its body.
+
+        The caller owns the returned response and must close it, which
+        create_streaming_response does once the body has been sent.
+        """
+        return await self._send(
+            service_name, path, method, headers, body, query_params, content, stream=True, timeout=timeout
+        )
+
     async def close(self):
-        await self.client.aclose()
+        for client in self.clients.values():
+            await client.aclose()
 
 proxy = ServiceProxy()
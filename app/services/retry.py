@@ -0,0 +1,144 @@
+import random
+import time
+from typing import Any, Dict, List, Optional
+from app.config.settings import settings
+
+# retried when a call fails; hedging also sends a duplicate, so only for safe methods
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class RetryConfig:
+    __slots__ = (
+        "max_attempts", "backoff_base", "backoff_max", "status_codes",
+        "budget_ratio", "budget_min_per_second", "budget_max_tokens",
+        "hedge", "hedge_percentile", "hedge_min_delay", "hedge_min_samples",
+    )
+
+    def __init__(self, service_name: str):
+        self.max_attempts = settings.RETRY_MAX_ATTEMPTS
+        self.backoff_base = settings.RETRY_BACKOFF_BASE
+        self.backoff_max = settings.RETRY_BACKOFF_MAX
+        self.status_codes = frozenset(settings.RETRY_STATUS_CODES)
+        self.budget_ratio = settings.RETRY_BUDGET_RATIO
+        self.budget_min_per_second = settings.RETRY_BUDGET_MIN_PER_SECOND
+        self.budget_max_tokens = settings.RETRY_BUDGET_MAX_TOKENS
+        self.hedge = settings.HEDGE_ENABLED
+        self.hedge_percentile = settings.HEDGE_PERCENTILE
+        self.hedge_min_delay = settings.HEDGE_MIN_DELAY
+        self.hedge_min_samples = settings.HEDGE_MIN_SAMPLES
+        for name, value in settings.RETRY_OVERRIDES.get(service_name, {}).items():
+            setattr(self, name, value)
+        self.status_codes = frozenset(self.status_codes)
+
+    def backoff(self, retry: int) -> float:
+        """Full jitter: uniform in [0, base * 2^retry], capped."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** retry)))
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every call to a service. Each call deposits
+    `budget_ratio` tokens and the bucket also refills slowly over time;
+    every retry or hedge spends a whole token. During an outage the extra
+    load is therefore capped at about `budget_ratio` of the traffic.
+    """
+
+    __slots__ = ("config", "tokens", "updated_at")
+
+    def __init__(self, config: RetryConfig):
+        self.config = config
+        self.tokens = config.budget_max_tokens
+        self.updated_at = time.monotonic()
+
+    def _refill(self, amount: float):
+        now = time.monotonic()
+        amount += (now - self.updated_at) * self.config.budget_min_per_second
+        self.updated_at = now
+        self.tokens = min(self.config.budget_max_tokens, self.tokens + amount)
+
+    def deposit(self):
+        self._refill(self.config.budget_ratio)
+
+    def withdraw(self) -> bool:
+        self._refill(0.0)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """Recent upstream latencies; the hedge percentile is recomputed every few samples, not per call."""
+
+    __slots__ = ("samples", "size", "next_index", "count", "cached", "stale")
+
+    RECOMPUTE_EVERY = 32
+
+    def __init__(self, size: int = 512):
+        self.samples: List[float] = []
+        self.size = size
+        self.next_index = 0
+        self.count = 0
+        self.cached: Optional[float] = None
+        self.stale = 0
+
+    def observe(self, seconds: float):
+        if len(self.samples) < self.size:
+            self.samples.append(seconds)
+        else:
+            self.samples[self.next_index] = seconds
+            self.next_index = (self.next_index + 1) % self.size
+        self.count += 1
+        self.stale += 1
+
+    def percentile(self, q: float) -> float:
+        if self.cached is None or self.stale >= self.RECOMPUTE_EVERY:
+            ordered = sorted(self.samples)
+            self.cached = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+            self.stale = 0
+        return self.cached
+
+
+class ServiceRetry:
+    __slots__ = ("config", "budget", "latency")
+
+    def __init__(self, service_name: str):
+        self.config = RetryConfig(service_name)
+        self.budget = RetryBudget(self.config)
+        self.latency = LatencyTracker()
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait before a hedged duplicate, None while there isn't enough history."""
+        if not self.config.hedge or self.latency.count < self.config.hedge_min_samples:
+            return None
+        return max(self.config.hedge_min_delay, self.latency.percentile(self.config.hedge_percentile))
+
+
+class RetryPolicy:
+    def __init__(self):
+        self.services: Dict[str, ServiceRetry] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def get(self, service_name: str) -> ServiceRetry:
+        state = self.services.get(service_name)
+        if state is None:
+            state = self.services[service_name] = ServiceRetry(service_name)
+            self.counters[service_name] = {"retries": 0, "hedges": 0, "hedge_wins": 0, "budget_exhausted": 0}
+        return state
+
+    def count(self, service_name: str, name: str):
+        self.counters[service_name][name] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for service_name, state in self.services.items():
+            delay = state.hedge_delay()
+            result[service_name] = {
+                **self.counters[service_name],
+                "budget_tokens": round(state.budget.tokens, 2),
+                "hedge_delay_ms": round(delay * 1000, 3) if delay is not None else None,
+            }
+        return result
+
+retry_policy = RetryPolicy()
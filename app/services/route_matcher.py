@@ -0,0 +1,152 @@
+from fastapi import HTTPException
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+AUTH_MODES = ("required", "optional", "none")
+BODY_MODES = (None, "json", "stream")
+INGEST_MODES = (None, "buffer", "flush")
+
+
+class UpstreamRoute:
+    """
+    One gateway endpoint, forwarded to the same path on an upstream service.
+
+    auth: "required", "optional" or "none".
+    body: None (nothing forwarded), "json" (read and validated) or "stream".
+    decompress: accept a gzip, br or zstd encoded body and forward it decoded.
+    cache_ttl: cache GET responses for this long, None disables caching.
+    per_subject: cached responses are keyed by the caller's JWT subject.
+    timeout: upstream read timeout, None uses the service pool's.
+    invalidates: path template whose cached responses a call makes stale;
+        `{subject}` is the caller's JWT subject.
+    after: called with (request, upstream response) before it is relayed.
+    ingest: with COORDINATE_BUFFER_ENABLED, "buffer" queues the posted points
+        in the coordinate buffer instead of forwarding them, "flush" sends the
+        trip's buffered points before forwarding.
+    """
+
+    __slots__ = (
+        "method", "path", "service", "auth", "rate_limit", "body", "decompress",
+        "cache_ttl", "per_subject", "timeout", "invalidates", "after", "ingest", "segments",
+    )
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        service: str,
+        auth: str = "optional",
+        rate_limit: str = "default",
+        body: Optional[str] = None,
+        decompress: bool = False,
+        cache_ttl: Optional[float] = None,
+        per_subject: bool = False,
+        timeout: Optional[float] = None,
+        invalidates: Optional[str] = None,
+        after: Optional[Callable[..., Any]] = None,
+        ingest: Optional[str] = None
+    ):
+        if auth not in AUTH_MODES:
+            raise ValueError(f"{method} {path}: unknown auth mode {auth!r}")
+        if body not in BODY_MODES:
+            raise ValueError(f"{method} {path}: unknown body mode {body!r}")
+        if ingest not in INGEST_MODES:
+            raise ValueError(f"{method} {path}: unknown ingest mode {ingest!r}")
+        self.method = method.upper()
+        self.path = path
+        self.service = service
+        self.auth = auth
+        self.rate_limit = rate_limit
+        self.body = body
+        self.decompress = decompress
+        self.cache_ttl = cache_ttl
+        self.per_subject = per_subject
+        self.timeout = timeout
+        self.invalidates = invalidates
+        self.after = after
+        self.ingest = ingest
+        self.segments = _split(path)
+
+
+def _split(path: str) -> List[str]:
+    return [segment for segment in path.split("/") if segment]
+
+
+class _Node:
+    __slots__ = ("static", "param", "param_name", "routes")
+
+    def __init__(self):
+        self.static: Dict[str, "_Node"] = {}
+        self.param: Optional["_Node"] = None
+        self.param_name: Optional[str] = None
+        self.routes: Dict[str, UpstreamRoute] = {}
+
+
+class RouteMatcher:
+    """
+    Segment trie built once from the route table.
+
+    A lookup walks one node per path segment, literal segments before
+    `{param}` ones, so its cost depends on the path depth and not on how
+    many routes are registered.
+    """
+
+    def __init__(self, routes: Iterable[UpstreamRoute]):
+        self.root = _Node()
+        self.routes: List[UpstreamRoute] = []
+        for route in routes:
+            self.add(route)
+
+    def add(self, route: UpstreamRoute):
+        node = self.root
+        for segment in route.segments:
+            if segment.startswith("{") and segment.endswith("}"):
+                name = segment[1:-1]
+                if node.param is None:
+                    node.param = _Node()
+                    node.param_name = name
+                elif node.param_name != name:
+                    raise ValueError(f"{route.path}: parameter {{{name}}} conflicts with {{{node.param_name}}}")
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+        if route.method in node.routes:
+            raise ValueError(f"Duplicate route {route.method} {route.path}")
+        node.routes[route.method] = route
+        self.routes.append(route)
+
+    def _find(self, node: _Node, segments: List[str], index: int, params: Dict[str, str]) -> Optional[_Node]:
+        if index == len(segments):
+            return node if node.routes else None
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._find(child, segments, index + 1, params)
+            if found is not None:
+                return found
+        if node.param is not None:
+            found = self._find(node.param, segments, index + 1, params)
+            if found is not None:
+                params[node.param_name] = segment
+                return found
+        return None
+
+    def match(self, method: str, path: str) -> Tuple[UpstreamRoute, Dict[str, str]]:
+        """Route and path parameters for a request, or a 404/405 HTTPException."""
+        params: Dict[str, str] = {}
+        node = self._find(self.root, _split(path), 0, params)
+        if node is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        route = node.routes.get(method)
+        if route is None and method == "HEAD":
+            # served by the GET route; the server leaves out the body
+            route = node.routes.get("GET")
+        if route is None:
+            allowed = set(node.routes)
+            if "GET" in allowed:
+                allowed.add("HEAD")
+            raise HTTPException(
+                status_code=405,
+                detail="Method Not Allowed",
+                headers={"Allow": ", ".join(sorted(allowed))}
+            )
+        return route, params
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one.
+
+    The first caller for a key starts `fn` in its own task, every caller
+    that arrives while it is running awaits the same task and gets its
+    result or its exception. A caller being cancelled doesn't cancel the
+    shared call unless it was the last one waiting for it.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, _Call] = {}
+        self.counters = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self.calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self.calls[key] = call
+            call.task.add_done_callback(lambda _task, key=key, call=call: self._forget(key, call))
+            self.counters["leaders"] += 1
+        else:
+            self.counters["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # detach first so a caller arriving now starts a fresh call
+                self._forget_key(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget_key(self, key: str, call: _Call):
+        if self.calls.get(key) is call:
+            del self.calls[key]
+
+    def _forget(self, key: str, call: _Call):
+        self._forget_key(key, call)
+        # nobody is left to retrieve it, avoid "exception was never retrieved"
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "in_flight": len(self.calls)}
+
+
+single_flight = SingleFlight()
@@ -1,38 +1,184 @@
-from fastapi import HTTPException, Security, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
+import hashlib
+import httpx
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwk, jwt
 from app.config.settings import settings
-from typing import Optional
+from app.utils import codec
+from app.utils.shared_state import SharedRevocationTable
+from typing import Any, Dict, Optional, Tuple
 
-security_strict = HTTPBearer()
-security_optional = HTTPBearer(auto_error=False)
+class TokenVerifier:
+    """
+    jwt.decode behind a bounded cache keyed by the token's SHA-256 digest.
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Security(security_strict)) -> dict:
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(
-            token,
-            settings.JWT_SECRET_KEY,
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        return payload
-    except JWTError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-def optional_verify_token(credentials: Optional[HTTPAuthorizationCredentials] = Security(security_optional)) -> Optional[dict]:
-    if credentials is None:
+    Valid tokens are cached until their `exp` (capped at JWT_CACHE_MAX_TTL),
+    invalid ones are negatively cached for JWT_NEGATIVE_CACHE_TTL, and
+    revoked ones are rejected until they expire. With a
+    SharedRevocationTable, a logout through any worker process revokes the
+    token in all of them, cached or not. Keys are constructed once at
+    startup: the HMAC secret, or every key of a local JWKS file looked up
+    by `kid` for asymmetric algorithms.
+    """
+
+    def __init__(self, revocations: Optional[SharedRevocationTable] = None):
+        # digest -> (payload or None if rejected, valid until as unix time)
+        self.cache: "OrderedDict[bytes, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self.revoked: Dict[bytes, float] = {}
+        self.revocations = revocations
+        self.counters = {"hits": 0, "misses": 0, "rejected": 0}
+        self.verify_seconds = 0.0
+        self.keys_by_kid: Dict[str, Any] = {}
+        self.default_key: Any = None
+        self.algorithms = [settings.JWT_ALGORITHM]
+        self._load_keys()
+
+    def _load_keys(self):
+        if not settings.JWT_JWKS_FILE:
+            self.default_key = jwk.construct(settings.JWT_SECRET_KEY, settings.JWT_ALGORITHM)
+            return
+
+        with open(settings.JWT_JWKS_FILE, "rb") as f:
+            jwks = codec.loads(f.read())
+        for key_data in jwks.get("keys", []):
+            algorithm = key_data.get("alg") or settings.JWT_ALGORITHM
+            if algorithm not in self.algorithms:
+                self.algorithms.append(algorithm)
+            self.keys_by_kid[key_data.get("kid", "")] = jwk.construct(key_data, algorithm)
+        if len(self.keys_by_kid) == 1:
+            self.default_key = next(iter(self.keys_by_kid.values()))
+
+    def _key_for(self, token: str) -> Any:
+        if not self.keys_by_kid:
+            return self.default_key
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.keys_by_kid.get(kid) if kid is not None else self.default_key
+        if key is None:
+            raise JWTError("Unknown key id")
+        return key
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            return self._decode(token)
+        finally:
+            self.verify_seconds += time.perf_counter() - started
+
+    def _decode(self, token: str) -> Dict[str, Any]:
+        digest = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+
+        cached = self.cache.get(digest)
+        if cached is not None and now < cached[1]:
+            self.cache.move_to_end(digest)
+            self.counters["hits"] += 1
+            if cached[0] is None:
+                self.counters["rejected"] += 1
+                raise JWTError("Token rejected")
+            # another worker may have seen the logout since this was cached
+            if self.revocations is None:
+                return dict(cached[0])
+            revoked_until = self.revocations.revoked_until(digest)
+            if revoked_until is None or now >= revoked_until:
+                return dict(cached[0])
+        else:
+            self.counters["misses"] += 1
+            revoked_until = self._revoked_until(digest)
+        if revoked_until is not None and now < revoked_until:
+            self._store(digest, None, revoked_until)
+            self.counters["rejected"] += 1
+            raise JWTError("Token revoked")
+
+        try:
+            payload = jwt.decode(token, self._key_for(token), algorithms=self.algorithms)
+        except JWTError:
+            self._store(digest, None, now + settings.JWT_NEGATIVE_CACHE_TTL)
+            self.counters["rejected"] += 1
+            raise
+
+        valid_until = now + settings.JWT_CACHE_MAX_TTL
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            valid_until = min(valid_until, exp)
+        self._store(digest, payload, valid_until)
+        return dict(payload)
+
+    def _revoked_until(self, digest: bytes) -> Optional[float]:
+        revoked_until = self.revoked.get(digest)
+        if revoked_until is None and self.revocations is not None:
+            revoked_until = self.revocations.revoked_until(digest)
+        return revoked_until
+
+    def _store(self, digest: bytes, payload: Optional[Dict[str, Any]], valid_until: float):
+        self.cache[digest] = (payload, valid_until)
+        self.cache.move_to_end(digest)
+        while len(self.cache) > settings.JWT_CACHE_MAX_ENTRIES:
+            self.cache.popitem(last=False)
+
+    def revoke(self, token: str):
+        """Reject this token from now on, until its own expiry."""
+        digest = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        try:
+            exp = jwt.get_unverified_claims(token).get("exp")
+        except JWTError:
+            exp = None
+        revoked_until = exp if isinstance(exp, (int, float)) else now + settings.JWT_CACHE_MAX_TTL
+
+        if len(self.revoked) >= settings.JWT_CACHE_MAX_ENTRIES:
+            self.revoked = {k: v for k, v in self.revoked.items() if v > now}
+        self.revoked[digest] = revoked_until
+        self._store(digest, None, revoked_until)
+        if self.revocations is not None:
+            self.revocations.revoke(digest, revoked_until, now)
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "cached": len(self.cache),
+            "revoked": len(self.revoked),
+            "avg_verify_us": round(self.verify_seconds / calls * 1e6, 2) if calls else 0.0,
+        }
+
+token_verifier = TokenVerifier(
+    SharedRevocationTable(
+        settings.JWT_REVOCATION_SHM_NAME, settings.JWT_REVOCATION_SHM_SLOTS, settings.SHARED_STATE_LOCK_FILE
+    ) if settings.SHARED_STATE else None
+)
+
+def authenticate(request: Request, mode: str) -> Optional[dict]:
+    """
+    Bearer token check for table routes. mode is "required" (401 without a
+    valid token), "optional" (None without one) or "none".
+    """
+    if mode == "none":
+        return None
+
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not credentials.strip():
+        if mode == "required":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not authenticated",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         return None
+
     try:
-        token = credentials.credentials
-        payload = jwt.decode(
-            token,
-            settings.JWT_SECRET_KEY,
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        return payload
+        return token_verifier.decode(credentials.strip())
     except JWTError:
+        if mode == "required":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         return None
+
+def revoke_on_logout(request: Request, upstream: httpx.Response):
+    # the token is dead upstream, stop accepting it at the gateway too
+    authorization = request.headers.get("authorization", "")
+    if upstream.status_code < 400 and authorization[:7].lower() == "bearer ":
+        token_verifier.revoke(authorization[7:].strip())
@@ -1,70 +1,267 @@
+import time
 from enum import Enum
-from datetime import datetime, timedelta
-from typing import Dict
+from typing import Any, Callable, Dict, List, Optional
 from app.config.settings import settings
+from app.utils.logger import get_logger
+from app.utils.shared_state import SharedCircuitBoard
+
+logger = get_logger("circuit_breaker")
 
 class CircuitState(Enum):
     CLOSED = "closed"
     OPEN = "open"
     HALF_OPEN = "half_open"
 
+# codes on the shared board; HALF_OPEN is never published, every worker probes on its own
+SHARED_STATES = {CircuitState.CLOSED: 0, CircuitState.OPEN: 1}
+
+class CircuitConfig:
+    __slots__ = (
+        "window_seconds", "window_buckets", "min_calls", "failure_rate",
+        "slow_call_rate", "slow_call_seconds", "open_seconds",
+        "half_open_max_calls", "half_open_successes",
+    )
+
+    def __init__(self, service_name: str):
+        self.window_seconds = settings.CIRCUIT_BREAKER_WINDOW_SECONDS
+        self.window_buckets = settings.CIRCUIT_BREAKER_WINDOW_BUCKETS
+        self.min_calls = settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD
+        self.failure_rate = settings.CIRCUIT_BREAKER_FAILURE_RATE
+        self.slow_call_rate = settings.CIRCUIT_BREAKER_SLOW_CALL_RATE
+        self.slow_call_seconds = settings.CIRCUIT_BREAKER_SLOW_CALL_SECONDS
+        self.open_seconds = settings.CIRCUIT_BREAKER_TIMEOUT
+        self.half_open_max_calls = settings.CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS
+        self.half_open_successes = settings.CIRCUIT_BREAKER_HALF_OPEN_SUCCESSES
+        # endpoint circuits ("<service>@<url>") take their service's overrides
+        for name, value in settings.CIRCUIT_BREAKER_OVERRIDES.get(service_name.partition("@")[0], {}).items():
+            setattr(self, name, value)
+
+class RollingWindow:
+    """Call/failure/slow counts over the last `window_seconds`, in fixed time buckets."""
+
+    __slots__ = ("bucket_seconds", "epochs", "calls", "failures", "slow")
+
+    def __init__(self, window_seconds: float, buckets: int):
+        self.bucket_seconds = window_seconds / buckets
+        self.epochs = [-1] * buckets
+        self.calls = [0] * buckets
+        self.failures = [0] * buckets
+        self.slow = [0] * buckets
+
+    def add(self, now: float, failed: bool, slow: bool):
+        epoch = int(now / self.bucket_seconds)
+        slot = epoch % len(self.epochs)
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.calls[slot] = self.failures[slot] = self.slow[slot] = 0
+        self.calls[slot] += 1
+        if failed:
+            self.failures[slot] += 1
+        if slow:
+            self.slow[slot] += 1
+
+    def totals(self, now: float):
+        oldest = int(now / self.bucket_seconds) - len(self.epochs) + 1
+        calls = failures = slow = 0
+        for slot, epoch in enumerate(self.epochs):
+            if epoch >= oldest:
+                calls += self.calls[slot]
+                failures += self.failures[slot]
+                slow += self.slow[slot]
+        return calls, failures, slow
+
+    def reset(self):
+        for slot in range(len(self.epochs)):
+            self.epochs[slot] = -1
+
+class Circuit:
+    __slots__ = (
+        "service_name", "config", "state", "window", "opened_at", "probes_in_flight", "probe_successes",
+        "shared_offset", "shared_changed_at",
+    )
+
+    def __init__(self, service_name: str):
+        self.service_name = service_name
+        self.config = CircuitConfig(service_name)
+        self.state = CircuitState.CLOSED
+        self.window = RollingWindow(self.config.window_seconds, self.config.window_buckets)
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        # slot on the shared board and the last transition applied from it
+        self.shared_offset: Optional[int] = None
+        self.shared_changed_at = 0.0
+
+# listener(service_name, old_state, new_state)
+TransitionListener = Callable[[str, CircuitState, CircuitState], None]
+
 class CircuitBreaker:
-    def __init__(self):
-        self.circuits: Dict[str, dict] = {}
-
-    def _get_circuit(self, service_name: str) -> dict:
-        if service_name not in self.circuits:
-            self.circuits[service_name] = {
-                "state": CircuitState.CLOSED,
-                "failure_count": 0,
-                "last_failure_time": None,
-                "success_count": 0
-            }
-        return self.circuits[service_name]
+    """
+    Per-service breaker on a monotonic clock.
+
+    CLOSED trips to OPEN once the rolling window holds at least `min_calls`
+    calls and either the failure rate or the slow-call rate reaches its
+    threshold. After `open_seconds` it goes HALF_OPEN and admits at most
+    `half_open_max_calls` concurrent probes: `half_open_successes` successes
+    close it, any failure re-opens it.
+
+    Everything runs on the event loop thread, so no locking is needed. With
+    a SharedCircuitBoard, worker processes publish their OPEN and CLOSED
+    transitions and adopt each other's, so one worker tripping a circuit
+    stops traffic from all of them. Rolling windows stay per worker.
+    """
+
+    def __init__(self, board: Optional[SharedCircuitBoard] = None):
+        self.circuits: Dict[str, Circuit] = {}
+        self.listeners: List[TransitionListener] = []
+        self.transitions: Dict[str, int] = {}
+        self.board = board
+
+    def subscribe(self, listener: TransitionListener):
+        self.listeners.append(listener)
+
+    def _get_circuit(self, service_name: str) -> Circuit:
+        circuit = self.circuits.get(service_name)
+        if circuit is None:
+            circuit = self.circuits[service_name] = Circuit(service_name)
+            if self.board is not None:
+                circuit.shared_offset = self.board.slot_for(service_name)
+        if self.board is not None:
+            self._sync(circuit)
+        return circuit
+
+    def _sync(self, circuit: Circuit):
+        """Adopt a transition another worker published since we last looked."""
+        record = self.board.read(circuit.shared_offset)
+        if record is None or record[1] <= circuit.shared_changed_at:
+            return
+        code, changed_at = record
+        circuit.shared_changed_at = changed_at
+        if code == SHARED_STATES[CircuitState.OPEN]:
+            if circuit.state != CircuitState.OPEN:
+                self._transition(circuit, CircuitState.OPEN, changed_at, publish=False)
+            circuit.opened_at = changed_at
+        elif circuit.state != CircuitState.CLOSED:
+            self._transition(circuit, CircuitState.CLOSED, changed_at, publish=False)
+
+    def _transition(self, circuit: Circuit, new_state: CircuitState, now: float, publish: bool = True):
+        old_state = circuit.state
+        circuit.state = new_state
+        circuit.probes_in_flight = 0
+        circuit.probe_successes = 0
+        if new_state == CircuitState.OPEN:
+            circuit.opened_at = now
+        elif new_state == CircuitState.CLOSED:
+            circuit.window.reset()
+        if publish and self.board is not None and new_state in SHARED_STATES:
+            self.board.write(circuit.shared_offset, SHARED_STATES[new_state], now)
+            circuit.shared_changed_at = now
+
+        key = f"{old_state.value}->{new_state.value}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        # a change adopted from another worker was already logged there
+        if publish:
+            logger.warning("circuit state change", extra={
+                "upstream": circuit.service_name,
+                "from_state": old_state.value,
+                "to_state": new_state.value,
+            })
+        for listener in self.listeners:
+            try:
+                listener(circuit.service_name, old_state, new_state)
+            except Exception:
+                pass
 
     def can_execute(self, service_name: str) -> bool:
+        """Whether a call may go out. In HALF_OPEN a True takes a probe slot until the call is recorded."""
         circuit = self._get_circuit(service_name)
 
-        if circuit["state"] == CircuitState.CLOSED:
+        if circuit.state == CircuitState.CLOSED:
             return True
 
-        if circuit["state"] == CircuitState.OPEN:
-            if circuit["last_failure_time"]:
-                timeout_expired = datetime.now() > circuit["last_failure_time"] + timedelta(
-                    seconds=settings.CIRCUIT_BREAKER_TIMEOUT
-                )
-                if timeout_expired:
-                    circuit["state"] = CircuitState.HALF_OPEN
-                    circuit["success_count"] = 0
-                    return True
-            return False
+        if circuit.state == CircuitState.OPEN:
+            now = time.monotonic()
+            if now - circuit.opened_at < circuit.config.open_seconds:
+                return False
+            self._transition(circuit, CircuitState.HALF_OPEN, now)
 
+        if circuit.probes_in_flight >= circuit.config.half_open_max_calls:
+            return False
+        circuit.probes_in_flight += 1
         return True
 
-    def record_success(self, service_name: str):
+    def is_available(self, service_name: str) -> bool:
+        """Whether can_execute would let a call through, without taking a probe slot."""
         circuit = self._get_circuit(service_name)
+        if circuit.state == CircuitState.CLOSED:
+            return True
+        if circuit.state == CircuitState.OPEN:
+            return time.monotonic() - circuit.opened_at >= circuit.config.open_seconds
+        return circuit.probes_in_flight < circuit.config.half_open_max_calls
+
+    def record_success(self, service_name: str, duration: float = 0.0):
+        self._record(service_name, False, duration)
 
-        if circuit["state"] == CircuitState.HALF_OPEN:
-            circuit["success_count"] += 1
-            if circuit["success_count"] >= 2:
-                circuit["state"] = CircuitState.CLOSED
-                circuit["failure_count"] = 0
-        else:
-            circuit["failure_count"] = 0
+    def record_failure(self, service_name: str, duration: float = 0.0):
+        self._record(service_name, True, duration)
+
+    def release(self, service_name: str):
+        """Give back a probe slot for a call that ended without an upstream outcome."""
+        circuit = self._get_circuit(service_name)
+        if circuit.state == CircuitState.HALF_OPEN and circuit.probes_in_flight > 0:
+            circuit.probes_in_flight -= 1
 
-    def record_failure(self, service_name: str):
+    def _record(self, service_name: str, failed: bool, duration: float):
         circuit = self._get_circuit(service_name)
-        circuit["failure_count"] += 1
-        circuit["last_failure_time"] = datetime.now()
+        config = circuit.config
+        now = time.monotonic()
+        slow = duration >= config.slow_call_seconds
 
-        print(f"[CIRCUIT BREAKER] {service_name} - Failure recorded. Count: {circuit['failure_count']}/{settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD}, State: {circuit['state'].value}")
+        if circuit.state == CircuitState.HALF_OPEN:
+            if circuit.probes_in_flight > 0:
+                circuit.probes_in_flight -= 1
+            if failed or slow:
+                self._transition(circuit, CircuitState.OPEN, now)
+            else:
+                circuit.probe_successes += 1
+                if circuit.probe_successes >= config.half_open_successes:
+                    self._transition(circuit, CircuitState.CLOSED, now)
+            return
 
-        if circuit["failure_count"] >= settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD:
-            print(f"[CIRCUIT BREAKER] {service_name} - OPENING CIRCUIT (threshold reached)")
-            circuit["state"] = CircuitState.OPEN
+        if circuit.state == CircuitState.OPEN:
+            # late result of a call admitted before the circuit opened
+            return
+
+        circuit.window.add(now, failed, slow)
+        if not failed and not slow:
+            return
+
+        calls, failures, slow_calls = circuit.window.totals(now)
+        if calls < config.min_calls:
+            return
+        if failures / calls >= config.failure_rate or slow_calls / calls >= config.slow_call_rate:
+            self._transition(circuit, CircuitState.OPEN, now)
 
     def get_state(self, service_name: str) -> CircuitState:
         circuit = self._get_circuit(service_name)
-        return circuit["state"]
+        return circuit.state
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        result = {}
+        for service_name, circuit in self.circuits.items():
+            calls, failures, slow_calls = circuit.window.totals(now)
+            result[service_name] = {
+                "state": circuit.state.value,
+                "calls": calls,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "slow_call_rate": round(slow_calls / calls, 3) if calls else 0.0,
+                "probes_in_flight": circuit.probes_in_flight,
+            }
+        return result
 
-circuit_breaker = CircuitBreaker()
+circuit_breaker = CircuitBreaker(
+    SharedCircuitBoard(
+        settings.CIRCUIT_BREAKER_SHM_NAME, settings.CIRCUIT_BREAKER_SHM_SLOTS, settings.SHARED_STATE_LOCK_FILE
+    ) if settings.SHARED_STATE else None
+)
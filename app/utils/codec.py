@@ -0,0 +1,71 @@
+import importlib.util
+import json
+from typing import Any, Callable, Optional, Union
+from fastapi.responses import JSONResponse
+from app.config.settings import settings
+
+# Every JSON the gateway itself parses or produces goes through dumps/loads.
+# JSON_CODEC picks the backend: "auto" takes the fastest one installed
+# (orjson, then msgspec), "stdlib" forces the json module. All of them emit
+# compact UTF-8 and raise ValueError (or a subclass) on bad input; msgspec's
+# DecodeError isn't one, so it is re-raised as such.
+
+CODECS = ("orjson", "msgspec", "stdlib")
+
+
+def _select(name: str) -> str:
+    if name == "auto":
+        return next(c for c in CODECS if c == "stdlib" or importlib.util.find_spec(c) is not None)
+    if name not in CODECS:
+        raise ValueError(f"Unknown JSON_CODEC {name!r}")
+    return name
+
+
+def _stdlib_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=default).encode()
+
+
+def _stdlib_loads(data: Union[bytes, str]) -> Any:
+    return json.loads(data)
+
+
+def _backend(name: str):
+    if name == "orjson":
+        import orjson
+
+        def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+            return orjson.dumps(obj, default=default)
+
+        return dumps, orjson.loads
+
+    if name == "msgspec":
+        import msgspec
+
+        encoder = msgspec.json.Encoder()
+        decoder = msgspec.json.Decoder()
+
+        def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+            if default is None:
+                return encoder.encode(obj)
+            return msgspec.json.encode(obj, enc_hook=default)
+
+        def loads(data: Union[bytes, str]) -> Any:
+            try:
+                return decoder.decode(data)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+
+        return dumps, loads
+
+    return _stdlib_dumps, _stdlib_loads
+
+
+CODEC_NAME = _select(settings.JSON_CODEC)
+dumps, loads = _backend(CODEC_NAME)
+
+
+class CodecJSONResponse(JSONResponse):
+    """JSONResponse rendered with the configured codec, for handlers and error responses alike."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
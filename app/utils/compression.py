@@ -0,0 +1,175 @@
+import asyncio
+import importlib.util
+import zlib
+from typing import AsyncIterator, Callable, List, MutableMapping, Optional
+from fastapi import HTTPException
+from app.config.settings import settings
+
+# gzip is always there; br and zstd only when their packages are installed.
+# When a client accepts several at the same q, the earlier one here wins.
+AVAILABLE_ENCODINGS = tuple(
+    name for name, module in (("zstd", "zstandard"), ("br", "brotli"), ("gzip", "zlib"))
+    if importlib.util.find_spec(module) is not None
+)
+
+# fast levels: the gateway compresses on the request path
+DEFAULT_LEVELS = {"gzip": 5, "br": 4, "zstd": 3}
+
+
+def _level(encoding: str) -> int:
+    return settings.COMPRESSION_LEVELS.get(encoding, DEFAULT_LEVELS[encoding])
+
+
+def _qvalue(params: List[str]) -> float:
+    for param in params:
+        name, _, value = param.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """The encoding to use for an Accept-Encoding header, None for identity."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        if coding:
+            accepted[coding] = _qvalue(params)
+
+    best, best_q = None, 0.0
+    for encoding in AVAILABLE_ENCODINGS:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type.endswith("+json"):
+        return True
+    # entries ending in "/" cover the whole family, e.g. "text/"
+    return any(
+        media_type == t or (t.endswith("/") and media_type.startswith(t))
+        for t in settings.COMPRESSION_TYPES
+    )
+
+
+def mark_encoded(headers: MutableMapping[str, str], encoding: str):
+    headers["content-encoding"] = encoding
+    # a different representation of the same resource
+    etag = headers.get("etag")
+    if etag is not None and not etag.startswith("W/"):
+        headers["etag"] = "W/" + etag
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """One-shot compression of a whole body."""
+    if encoding == "gzip":
+        compressor = zlib.compressobj(_level("gzip"), zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == "br":
+        import brotli
+        return brotli.compress(data, quality=_level("br"))
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=_level("zstd")).compress(data)
+    raise ValueError(f"Unsupported encoding {encoding!r}")
+
+
+async def compress_async(data: bytes, encoding: str) -> bytes:
+    """compress(), moved to a worker thread for bodies big enough to stall the event loop."""
+    if len(data) >= settings.COMPRESSION_THREAD_THRESHOLD:
+        return await asyncio.to_thread(compress, data, encoding)
+    return compress(data, encoding)
+
+
+class StreamCompressor:
+    """
+    Incremental compression of a streamed body. Each chunk is flushed, so a
+    line of an NDJSON stream reaches the client as soon as it is produced.
+    """
+
+    __slots__ = ("_compress", "_flush", "_finish")
+
+    def __init__(self, encoding: str):
+        if encoding == "gzip":
+            compressor = zlib.compressobj(_level("gzip"), zlib.DEFLATED, 31)
+            self._compress = compressor.compress
+            self._flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = compressor.flush
+        elif encoding == "br":
+            import brotli
+            compressor = brotli.Compressor(quality=_level("br"))
+            self._compress = compressor.process
+            self._flush = compressor.flush
+            self._finish = compressor.finish
+        elif encoding == "zstd":
+            import zstandard
+            compressor = zstandard.ZstdCompressor(level=_level("zstd")).compressobj()
+            self._compress = compressor.compress
+            self._flush = lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self._finish = compressor.flush
+        else:
+            raise ValueError(f"Unsupported encoding {encoding!r}")
+
+    def _chunk(self, data: bytes) -> bytes:
+        return self._compress(data) + self._flush()
+
+    async def compress(self, data: bytes) -> bytes:
+        if len(data) >= settings.COMPRESSION_THREAD_THRESHOLD:
+            return await asyncio.to_thread(self._chunk, data)
+        return self._chunk(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def _decompressor(encoding: str) -> Callable[[bytes], bytes]:
+    if encoding == "gzip":
+        return zlib.decompressobj(47).decompress  # gzip or zlib header
+    if encoding == "deflate":
+        return zlib.decompressobj().decompress
+    if encoding == "br" and "br" in AVAILABLE_ENCODINGS:
+        import brotli
+        return brotli.Decompressor().process
+    if encoding == "zstd" and "zstd" in AVAILABLE_ENCODINGS:
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress
+    raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding {encoding!r}")
+
+
+def request_decoder(encoding: str) -> Callable[[AsyncIterator[bytes], int], AsyncIterator[bytes]]:
+    """
+    A decoder for a compressed request body. It raises 415 right away for an
+    encoding the gateway can't read, so callers check before streaming.
+    """
+    decompress = _decompressor(encoding.strip().lower())
+
+    async def decode(chunks: AsyncIterator[bytes], max_size: int) -> AsyncIterator[bytes]:
+        # the size limit applies to the decoded body, so a small compressed
+        # upload can't expand into something the upstream would never accept
+        produced = 0
+        async for chunk in chunks:
+            try:
+                if len(chunk) >= settings.COMPRESSION_THREAD_THRESHOLD:
+                    data = await asyncio.to_thread(decompress, chunk)
+                else:
+                    data = decompress(chunk)
+            except Exception:
+                raise HTTPException(status_code=400, detail="Malformed compressed request body")
+            produced += len(data)
+            if produced > max_size:
+                raise HTTPException(status_code=413, detail="Request body too large")
+            if data:
+                yield data
+
+    return decode
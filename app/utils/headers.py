@@ -0,0 +1,164 @@
+import httpx
+from contextvars import ContextVar
+from typing import Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+from app.config.settings import settings
+from app.utils.logger import request_id
+
+# Header handling on raw ASGI (lowercase name, value) byte pairs. Request
+# headers are read straight from the scope's list and written once into the
+# list sent upstream; upstream response headers are copied once into the
+# list the client gets. Duplicated headers survive both ways.
+
+RawHeaders = List[Tuple[bytes, bytes]]
+# what header arguments accept: a raw list, Starlette/httpx Headers or a plain dict
+HeadersLike = Union[Mapping[str, str], RawHeaders]
+
+# RFC 9110 7.6.1, plus proxy-connection that old clients still send
+HOP_BY_HOP = frozenset({
+    b"connection", b"keep-alive", b"proxy-connection", b"proxy-authenticate",
+    b"proxy-authorization", b"te", b"trailer", b"transfer-encoding", b"upgrade",
+})
+
+DEADLINE_HEADER = settings.DEADLINE_HEADER.lower().encode("latin-1")
+
+# never forwarded as the client sent them: the gateway sets its own values
+REQUEST_DENYLIST = HOP_BY_HOP | {
+    b"host", DEADLINE_HEADER, b"x-request-id",
+    b"forwarded", b"x-forwarded-for", b"x-forwarded-host", b"x-forwarded-proto",
+}
+# a streamed body keeps the client's content-length so the upstream gets a
+# normal fixed-length request instead of a chunked one
+STREAMED_BODY_DENYLIST = REQUEST_DENYLIST
+BUFFERED_BODY_DENYLIST = REQUEST_DENYLIST | {b"content-length"}
+
+# upstream response headers handed back to the client as-is: caching,
+# validators, redirects, auth challenges and upstream rate limits
+RESPONSE_PASSTHROUGH = frozenset({
+    b"age",
+    b"cache-control",
+    b"content-language",
+    b"content-location",
+    b"etag",
+    b"expires",
+    b"last-modified",
+    b"location",
+    b"retry-after",
+    b"vary",
+    b"www-authenticate",
+    b"ratelimit-limit",
+    b"ratelimit-policy",
+    b"ratelimit-remaining",
+    b"ratelimit-reset",
+    b"x-ratelimit-limit",
+    b"x-ratelimit-remaining",
+    b"x-ratelimit-reset",
+})
+
+# X-Forwarded-* and X-Request-ID of the request being handled, added to every upstream call it makes
+forwarded: ContextVar[Sequence[Tuple[bytes, bytes]]] = ContextVar("forwarded", default=())
+
+
+def raw_pairs(headers: Optional[HeadersLike]) -> Iterable[Tuple[bytes, bytes]]:
+    """(name, value) byte pairs of a raw list, Starlette or httpx Headers, or a plain dict."""
+    if headers is None:
+        return ()
+    if isinstance(headers, list):
+        return headers
+    if isinstance(headers, httpx.Headers):
+        # httpx keeps names as the peer sent them
+        return ((k.lower(), v) for k, v in headers.raw)
+    raw = getattr(headers, "raw", None)
+    if raw is not None:
+        return raw
+    return ((k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items())
+
+
+def header_value(headers: Optional[HeadersLike], name: bytes) -> Optional[str]:
+    for key, value in raw_pairs(headers):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def forwarded_headers(scope) -> RawHeaders:
+    """What the gateway tells upstreams about the client: X-Forwarded-For/Host/Proto and the request id."""
+    prior = host = None
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            prior = value
+        elif name == b"host":
+            host = value
+    client = scope.get("client")
+    chain = prior
+    if client:
+        peer = client[0].encode("latin-1")
+        # uvicorn's proxy_headers may already have made the last hop the client
+        if prior is None:
+            chain = peer
+        elif prior.rsplit(b",", 1)[-1].strip() != peer:
+            chain = prior + b", " + peer
+    headers = [(b"x-forwarded-proto", scope.get("scheme", "http").encode("latin-1"))]
+    if chain:
+        headers.append((b"x-forwarded-for", chain))
+    if host:
+        headers.append((b"x-forwarded-host", host))
+    rid = request_id.get()
+    if rid:
+        headers.append((b"x-request-id", rid.encode("latin-1")))
+    return headers
+
+
+def upstream_request_headers(headers: Optional[HeadersLike], streamed_body: bool, stream: bool, deadline_ms: int) -> RawHeaders:
+    """
+    The headers of one upstream attempt, built in a single pass.
+
+    Drops hop-by-hop and gateway-owned headers (and those the client's
+    Connection header lists), then adds X-Forwarded-*, X-Request-ID and the
+    remaining time budget. Unless the response is relayed undecoded
+    (`stream`), Accept-Encoding is left to httpx, which decodes it.
+    """
+    denylist = STREAMED_BODY_DENYLIST if streamed_body else BUFFERED_BODY_DENYLIST
+    result: RawHeaders = []
+    connection = None
+    accept_encoding = False
+    for name, value in raw_pairs(headers):
+        if name in denylist:
+            if name == b"connection":
+                connection = value
+            continue
+        if name == b"accept-encoding":
+            if not stream:
+                continue
+            accept_encoding = True
+        result.append((name, value))
+
+    if connection is not None:
+        listed = {token.strip().lower() for token in connection.split(b",")} - HOP_BY_HOP
+        if listed:
+            result = [(name, value) for name, value in result if name not in listed]
+    if stream and not accept_encoding:
+        # relayed undecoded, so the upstream may only use what the client accepts
+        result.append((b"accept-encoding", b"identity"))
+    result.extend(forwarded.get())
+    result.append((DEADLINE_HEADER, str(deadline_ms).encode("latin-1")))
+    return result
+
+
+def relay_response_headers(upstream_headers: HeadersLike, raw: RawHeaders, framing: bool = False):
+    """
+    Append the passthrough upstream headers to a response's own raw list.
+
+    framing=True also relays Content-Encoding and Content-Length, for a body
+    sent exactly as the upstream encoded it.
+    """
+    for name, value in raw_pairs(upstream_headers):
+        if name in RESPONSE_PASSTHROUGH or (framing and (name == b"content-encoding" or name == b"content-length")):
+            raw.append((name, value))
+
+
+def message_headers(message: dict) -> RawHeaders:
+    """An ASGI response start message's header list, to be extended in place."""
+    headers = message.get("headers")
+    if not isinstance(headers, list):
+        headers = message["headers"] = list(headers or [])
+    return headers
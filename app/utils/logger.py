@@ -0,0 +1,150 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from app.config.settings import settings
+from app.utils import codec
+
+# request id of the request being handled, attached to every log record
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+SENSITIVE_HEADERS = frozenset({"authorization", "proxy-authorization", "cookie", "set-cookie", "x-api-key"})
+REDACTED = "[REDACTED]"
+
+# attributes every LogRecord has, anything else came in through `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def redact_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    return {k: (REDACTED if k.lower() in SENSITIVE_HEADERS else v) for k, v in headers.items()}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            entry["request_id"] = rid
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != "request_id" and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        elif record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return codec.dumps(entry, default=str).decode()
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the event loop: when the queue is full the record is dropped and counted."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatting happens on the listener thread, only freeze the message here
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+queue_handler: Optional[DroppingQueueHandler] = None
+
+
+def setup_logging():
+    """Route the "gateway" loggers through a bounded queue to a JSON stdout writer thread."""
+    global _listener, queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger("gateway")
+    root.setLevel(settings.LOG_LEVEL.upper())
+    root.handlers = [queue_handler]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records, called on app shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"gateway.{name}")
+
+
+access_logger = get_logger("access")
+
+
+def log_access(
+    method: str,
+    route: str,
+    path: str,
+    status: int,
+    duration: float,
+    upstream: Optional[str] = None,
+    upstream_duration: float = 0.0,
+    **fields: Any
+):
+    """
+    One line per request. Errors and slow requests are always logged,
+    successful fast ones only at LOG_SUCCESS_SAMPLE_RATE.
+    """
+    if not access_logger.isEnabledFor(logging.INFO):
+        return
+    if status < 400 and duration < settings.LOG_SLOW_REQUEST_SECONDS:
+        if random.random() >= settings.LOG_SUCCESS_SAMPLE_RATE:
+            return
+
+    access_logger.info(
+        "request",
+        extra={
+            "method": method,
+            "route": route,
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "upstream": upstream,
+            "upstream_ms": round(upstream_duration * 1000, 3),
+            **fields,
+        }
+    )
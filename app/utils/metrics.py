@@ -0,0 +1,201 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition without a client library. Everything is
+# touched from the event loop thread only, so recording is a dict lookup
+# plus an in-place increment: no locks, and histogram buckets are
+# allocated once per label set.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        self.values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) - amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        # per label set: [count per bucket..., count above last bound, sum]
+        self.children: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+        child[bisect_left(self.bounds, value)] += 1
+        child[-1] += value
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for labels, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds, child):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            cumulative += child[len(self.bounds)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(child[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # called at scrape time for values that already live elsewhere
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+def sample_lines(name: str, help_text: str, labelnames: Sequence[str], samples: Iterable[Tuple[Sequence[str], float]], kind: str = "gauge") -> List[str]:
+    """Exposition lines for values read at scrape time."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labelnames, labels)} {_number(value)}")
+    return lines
+
+
+class RequestTiming:
+    """
+    Per-request accumulator, shared through a ContextVar with code deeper in the pipeline.
+
+    `phases` holds seconds per pipeline phase (auth, rate_limit, body,
+    upstream_wait, upstream_connect, upstream_ttfb, response, compress...),
+    summed when a phase runs more than once, e.g. on retries.
+    """
+
+    __slots__ = ("upstream_seconds", "upstream", "phases")
+
+    def __init__(self):
+        self.upstream_seconds = 0.0
+        self.upstream: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value, durations in milliseconds."""
+        entries = [f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in self.phases.items()]
+        if self.upstream is not None:
+            entries.append(f'upstream;dur={self.upstream_seconds * 1000:.3f};desc="{self.upstream}"')
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+request_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's `phase`."""
+    timing = request_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - started)
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "gateway_requests_total", "Requests handled by the gateway.", ("route", "method", "status")))
+REQUEST_DURATION = registry.register(Histogram(
+    "gateway_request_duration_seconds", "Total time per request, until the last body byte is sent.", ("route", "method")))
+GATEWAY_OVERHEAD = registry.register(Histogram(
+    "gateway_overhead_seconds", "Time to response start minus time spent waiting on upstreams.", ("route", "method")))
+IN_FLIGHT = registry.register(Gauge(
+    "gateway_requests_in_flight", "Requests currently being handled."))
+UPSTREAM_REQUESTS = registry.register(Counter(
+    "gateway_upstream_requests_total", "Requests sent to upstream services.", ("service", "status")))
+UPSTREAM_DURATION = registry.register(Histogram(
+    "gateway_upstream_duration_seconds", "Upstream time until response headers.", ("service",)))
+UPSTREAM_IN_FLIGHT = registry.register(Gauge(
+    "gateway_upstream_requests_in_flight", "Requests currently waiting on an upstream.", ("service",)))
+PHASE_DURATION = registry.register(Histogram(
+    "gateway_phase_duration_seconds", "Time per request pipeline phase (see RequestTiming).", ("route", "phase")))
+UPSTREAM_CONCURRENCY_LIMIT = registry.register(Gauge(
+    "gateway_upstream_concurrency_limit", "Current adaptive concurrency limit per upstream service.", ("service",)))
+UPSTREAM_SHED = registry.register(Counter(
+    "gateway_upstream_shed_total", "Upstream calls rejected by the concurrency limiter.", ("service", "route_class")))
+CIRCUIT_TRANSITIONS = registry.register(Counter(
+    "gateway_circuit_breaker_transitions_total", "Circuit breaker state changes.", ("service", "from_state", "to_state")))
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import signal
+import threading
+from collections import Counter
+from typing import Dict
+
+# CPU sampling of the event loop with SIGPROF: every `interval` of process
+# CPU time the handler runs on the main thread and records the Python stack
+# it interrupted. A sampler thread would be biased instead: it only gets the
+# GIL when the loop releases it, i.e. almost always inside select().
+#
+# Output is the "folded" stack format read by flamegraph.pl, speedscope and
+# inferno: one "root;caller;callee count" line per distinct stack.
+
+_CWD = os.getcwd() + os.sep
+
+
+def _frame_name(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_CWD):
+        filename = filename[len(_CWD):]
+    else:
+        filename = os.sep.join(filename.rsplit(os.sep, 2)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """One capture at a time, while the process keeps serving requests."""
+
+    def __init__(self):
+        self.running = False
+        self.stacks: Counter = Counter()
+        self.names: Dict[object, str] = {}
+
+    def _handler(self, signum, frame):
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            name = self.names.get(code)
+            if name is None:
+                name = self.names[code] = _frame_name(code)
+            parts.append(name)
+            frame = frame.f_back
+        self.stacks[";".join(reversed(parts))] += 1
+
+    async def capture(self, seconds: float, interval: float) -> Dict[str, int]:
+        if self.running:
+            raise RuntimeError("A profile is already being captured")
+        if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+            raise RuntimeError("Profiling needs SIGPROF and the event loop on the main thread")
+
+        self.running = True
+        self.stacks = Counter()
+        previous = signal.signal(signal.SIGPROF, self._handler)
+        try:
+            signal.setitimer(signal.ITIMER_PROF, interval, interval)
+            await asyncio.sleep(seconds)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, previous)
+            self.running = False
+        return dict(self.stacks)
+
+
+def folded(stacks: Dict[str, int]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,111 @@
+from fastapi import HTTPException, Request, status
+from typing import Any, AsyncIterator, Optional, Union
+from app.config.settings import settings
+from app.utils import codec
+from app.utils.compression import request_decoder
+
+JSON_CONTENT_TYPES = frozenset({"application/json"})
+
+
+def _media_type(content_type: str) -> str:
+    return content_type.split(";", 1)[0].strip().lower()
+
+
+def content_encoding(request: Request) -> Optional[str]:
+    """The request body's Content-Encoding, None when it isn't encoded."""
+    encoding = request.headers.get("content-encoding")
+    if not encoding or encoding.strip().lower() == "identity":
+        return None
+    return encoding
+
+
+def check_request_body(request: Request, max_size: Optional[int] = None):
+    """
+    Reject a request body before reading it, based on its headers only.
+
+    A missing content-type is accepted as JSON (older app builds omit it),
+    anything else that is not JSON gets a 415. A declared length over the
+    limit gets a 413, undeclared (chunked) bodies are limited while streaming.
+    """
+    max_size = max_size or settings.MAX_REQUEST_BODY_SIZE
+
+    content_type = request.headers.get("content-type")
+    if content_type:
+        media_type = _media_type(content_type)
+        if media_type not in JSON_CONTENT_TYPES and not media_type.endswith("+json"):
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Request body must be JSON"
+            )
+
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        try:
+            declared = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Content-Length")
+        if declared > max_size:
+            raise HTTPException(
+                status_code=413,
+                detail="Request body too large"
+            )
+
+
+async def stream_request_body(request: Request, max_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    max_size = max_size or settings.MAX_REQUEST_BODY_SIZE
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_size:
+            raise HTTPException(
+                status_code=413,
+                detail="Request body too large"
+            )
+        if chunk:
+            yield chunk
+
+
+def _body_chunks(request: Request, max_size: Optional[int], decompress: bool) -> AsyncIterator[bytes]:
+    chunks = stream_request_body(request, max_size)
+    encoding = content_encoding(request)
+    if decompress and encoding is not None:
+        chunks = request_decoder(encoding)(chunks, max_size or settings.MAX_REQUEST_BODY_SIZE)
+    return chunks
+
+
+async def forwardable_body(
+    request: Request,
+    validate: bool = False,
+    max_size: Optional[int] = None,
+    decompress: bool = False
+) -> Union[bytes, AsyncIterator[bytes]]:
+    """
+    Prepare the client body for ServiceProxy without re-serializing it.
+
+    With validate=False the body is streamed to the upstream chunk by chunk.
+    With validate=True it is read once and checked to be well-formed JSON,
+    and the original bytes are forwarded. With decompress=True a gzip, br or
+    zstd body is decoded on the way through.
+    """
+    check_request_body(request, max_size)
+    chunks = _body_chunks(request, max_size, decompress)
+
+    if not validate:
+        return chunks
+
+    body = b"".join([chunk async for chunk in chunks])
+    try:
+        codec.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body")
+    return body
+
+
+async def read_json(request: Request, max_size: Optional[int] = None) -> Any:
+    """Read and decode a JSON body the gateway itself consumes, with the same checks."""
+    check_request_body(request, max_size)
+    body = b"".join([chunk async for chunk in _body_chunks(request, max_size, decompress=True)])
+    try:
+        return codec.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body")
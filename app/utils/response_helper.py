@@ -1,6 +1,11 @@
 from fastapi import Response
-import json
-from typing import Any, Dict
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import httpx
+from typing import Any, AsyncIterator, Dict
+from app.config.settings import settings
+from app.utils import codec
+from app.utils.headers import relay_response_headers
 
 
 def create_response_from_proxy(proxy_response: Dict[str, Any]) -> Response:
@@ -8,22 +13,63 @@ def create_response_from_proxy(proxy_response: Dict[str, Any]) -> Response:
     Create a FastAPI Response object from a proxy response dictionary.
 
     Args:
-        proxy_response: Dictionary with 'status_code', 'content', and 'headers'
+        proxy_response: Dictionary with 'status_code', 'content', and 'headers'.
+            When 'raw_content' is present the upstream bytes are sent unchanged,
+            and 'content_encoding' says if they are already compressed.
 
     Returns:
         FastAPI Response object with proper status code and content
     """
-    content = proxy_response["content"]
+    upstream_headers = proxy_response.get("headers") or {}
+    raw_content = proxy_response.get("raw_content")
 
-    if isinstance(content, dict):
-        content_str = json.dumps(content)
-    elif isinstance(content, str):
-        content_str = content
+    if raw_content is not None:
+        content_str = raw_content
     else:
-        content_str = str(content)
+        content = proxy_response["content"]
+        if isinstance(content, (dict, list)):
+            content_str = codec.dumps(content)
+        elif isinstance(content, str):
+            content_str = content
+        else:
+            content_str = str(content)
 
-    return Response(
+    response = Response(
         content=content_str,
         status_code=proxy_response["status_code"],
-        media_type="application/json"
+        media_type=upstream_headers.get("content-type", "application/json")
     )
+    # appended to the response's own header list, no intermediate dict
+    raw = response.raw_headers
+    relay_response_headers(upstream_headers, raw)
+    if proxy_response.get("content_encoding"):
+        raw.append((b"content-encoding", proxy_response["content_encoding"].encode("latin-1")))
+    if proxy_response.get("cache_status"):
+        raw.append((b"x-cache", proxy_response["cache_status"].encode("latin-1")))
+    return response
+
+
+async def _iter_upstream(upstream: httpx.Response) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in upstream.aiter_raw(settings.PROXY_STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+
+def create_streaming_response(upstream: httpx.Response) -> StreamingResponse:
+    """
+    Relay an upstream response opened with ServiceProxy.stream_request.
+
+    The body is sent chunk by chunk exactly as received (still encoded if the
+    upstream compressed it), so it is never decoded or re-serialized.
+    """
+    response = StreamingResponse(
+        _iter_upstream(upstream),
+        status_code=upstream.status_code,
+        media_type=upstream.headers.get("content-type", "application/json"),
+        background=BackgroundTask(upstream.aclose)
+    )
+    # raw bytes are relayed, so the upstream framing and encoding still apply
+    relay_response_headers(upstream.headers, response.raw_headers, framing=True)
+    return response
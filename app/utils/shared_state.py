@@ -0,0 +1,250 @@
+import fcntl
+import hashlib
+import os
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional, Tuple
+
+# State shared by the worker processes of one host (see app/server.py).
+# Writes are rare (circuit transitions, cache invalidations, logouts) and
+# take an flock; reads happen on the request path and take no lock: a
+# writer bumps a version/sequence number around each update and readers
+# retry or give up when it moved under them. CLOCK_MONOTONIC is system-wide on Linux, so
+# timestamps are comparable between processes.
+
+
+def attach_segment(name: str, size: int) -> shared_memory.SharedMemory:
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        shm = shared_memory.SharedMemory(name=name)
+        if shm.size < size:
+            shm.close()
+            raise ValueError(f"Shared memory segment {name} is smaller than configured, remove /dev/shm/{name}")
+    # workers come and go, the segment must outlive any one of them
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def hash_key(key: str) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class FileLock:
+    """Exclusive flock on `lock_path`, held for a `with` block; serializes writers across processes."""
+
+    def __init__(self, lock_path: str):
+        self.lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+
+    def __enter__(self):
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    def close(self):
+        os.close(self.lock_fd)
+
+
+class SharedCircuitBoard:
+    """
+    Last published (state, changed_at) of every circuit, keyed by circuit name.
+
+    Slots are (version, key hash, state, changed_at) and are never freed:
+    there is one per upstream endpoint, so the table stays tiny and a
+    circuit keeps the offset it was given for the life of the process.
+    """
+
+    SLOT = struct.Struct("<QQQd")
+    VERSION = struct.Struct("<Q")
+    DATA = struct.Struct("<Qd")
+    MAX_PROBES = 16
+
+    def __init__(self, name: str, slots: int, lock_path: str):
+        self.slots = slots
+        self.shm = attach_segment(name, slots * self.SLOT.size)
+        self.lock = FileLock(lock_path)
+
+    def slot_for(self, key: str) -> int:
+        """Offset of `key`'s slot, claiming a free one the first time."""
+        key_hash = hash_key(key)
+        start = key_hash % self.slots
+        with self.lock:
+            for probe in range(self.MAX_PROBES):
+                offset = ((start + probe) % self.slots) * self.SLOT.size
+                version, slot_hash, _, _ = self.SLOT.unpack_from(self.shm.buf, offset)
+                if slot_hash == key_hash:
+                    return offset
+                if slot_hash == 0:
+                    self.SLOT.pack_into(self.shm.buf, offset, version, key_hash, 0, 0.0)
+                    return offset
+        raise RuntimeError("Shared circuit table is full, raise CIRCUIT_BREAKER_SHM_SLOTS")
+
+    def read(self, offset: int) -> Optional[Tuple[int, float]]:
+        """(state, changed_at) or None if a write was in progress; the caller simply checks again later."""
+        buf = self.shm.buf
+        version = self.VERSION.unpack_from(buf, offset)[0]
+        state, changed_at = self.DATA.unpack_from(buf, offset + 16)
+        if version & 1 or self.VERSION.unpack_from(buf, offset)[0] != version:
+            return None
+        return state, changed_at
+
+    def write(self, offset: int, state: int, changed_at: float):
+        buf = self.shm.buf
+        with self.lock:
+            version = self.VERSION.unpack_from(buf, offset)[0]
+            self.VERSION.pack_into(buf, offset, version + 1)
+            self.DATA.pack_into(buf, offset + 16, state, changed_at)
+            self.VERSION.pack_into(buf, offset, version + 2)
+
+    def close(self):
+        self.lock.close()
+        self.shm.close()
+
+
+class SharedInvalidationLog:
+    """
+    Ring buffer of invalidated cache paths, so a write through one worker
+    drops the cached copies held by every other worker.
+
+    Each process remembers the last sequence number it applied; `poll`
+    returns the paths published since, or None when it fell more than a
+    ring behind and can no longer tell what changed.
+    """
+
+    HEADER = struct.Struct("<Q")
+    ENTRY = struct.Struct("<QH")
+    SLOT_SIZE = 256
+    MAX_PATH = SLOT_SIZE - ENTRY.size
+    # a path too long for a slot: readers drop everything instead
+    CLEAR_ALL = 0xFFFF
+
+    def __init__(self, name: str, slots: int, lock_path: str):
+        self.slots = slots
+        self.shm = attach_segment(name, self.HEADER.size + slots * self.SLOT_SIZE)
+        self.lock = FileLock(lock_path)
+        # history from before this process started is already reflected upstream
+        self.seen = self._sequence()
+
+    def _sequence(self) -> int:
+        return self.HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def _offset(self, seq: int) -> int:
+        return self.HEADER.size + (seq % self.slots) * self.SLOT_SIZE
+
+    def publish(self, path: str):
+        data = path.encode()
+        length = len(data) if len(data) <= self.MAX_PATH else self.CLEAR_ALL
+        buf = self.shm.buf
+        with self.lock:
+            seq = self._sequence() + 1
+            offset = self._offset(seq)
+            self.ENTRY.pack_into(buf, offset, seq, length)
+            if length != self.CLEAR_ALL:
+                buf[offset + self.ENTRY.size:offset + self.ENTRY.size + length] = data
+            self.HEADER.pack_into(buf, 0, seq)
+
+    def poll(self) -> Optional[List[str]]:
+        latest = self._sequence()
+        if latest == self.seen:
+            return []
+        first, self.seen = self.seen + 1, latest
+        if latest - first >= self.slots:
+            return None
+
+        buf = self.shm.buf
+        paths = []
+        for seq in range(first, latest + 1):
+            offset = self._offset(seq)
+            slot_seq, length = self.ENTRY.unpack_from(buf, offset)
+            if slot_seq != seq or length == self.CLEAR_ALL:
+                return None
+            path = bytes(buf[offset + self.ENTRY.size:offset + self.ENTRY.size + length]).decode()
+            # overwritten while we read it: a writer lapped us
+            if self.ENTRY.unpack_from(buf, offset)[0] != seq:
+                return None
+            paths.append(path)
+        return paths
+
+    def close(self):
+        self.lock.close()
+        self.shm.close()
+
+
+class SharedRevocationTable:
+    """
+    Tokens revoked by logout, keyed by the token's SHA-256 digest, so a
+    logout through one worker is honoured by all of them.
+
+    Slots are (version, key hash, revoked until) in an open-addressing
+    table; a slot whose time has passed is free again. When every probed
+    slot is live, the one closest to expiring is reused. Times are unix
+    time, like the tokens' `exp`.
+    """
+
+    SLOT = struct.Struct("<QQd")
+    VERSION = struct.Struct("<Q")
+    DATA = struct.Struct("<Qd")
+    MAX_PROBES = 8
+    READ_RETRIES = 16
+
+    def __init__(self, name: str, slots: int, lock_path: str):
+        self.slots = slots
+        self.shm = attach_segment(name, slots * self.SLOT.size)
+        self.lock = FileLock(lock_path)
+
+    @staticmethod
+    def _key(digest: bytes) -> int:
+        # 0 marks an empty slot
+        return int.from_bytes(digest[:8], "little") or 1
+
+    def revoke(self, digest: bytes, until: float, now: float):
+        key_hash = self._key(digest)
+        buf = self.shm.buf
+        start = key_hash % self.slots
+        with self.lock:
+            target = oldest_offset = oldest_until = None
+            for probe in range(self.MAX_PROBES):
+                offset = ((start + probe) % self.slots) * self.SLOT.size
+                _, slot_hash, slot_until = self.SLOT.unpack_from(buf, offset)
+                if slot_hash == key_hash:
+                    target = offset
+                    break
+                if target is None and (slot_hash == 0 or slot_until <= now):
+                    target = offset
+                if oldest_until is None or slot_until < oldest_until:
+                    oldest_offset, oldest_until = offset, slot_until
+            if target is None:
+                target = oldest_offset
+            version = self.VERSION.unpack_from(buf, target)[0]
+            self.VERSION.pack_into(buf, target, version + 1)
+            self.DATA.pack_into(buf, target + 8, key_hash, until)
+            self.VERSION.pack_into(buf, target, version + 2)
+
+    def _read(self, offset: int) -> Tuple[int, float]:
+        buf = self.shm.buf
+        for _ in range(self.READ_RETRIES):
+            version = self.VERSION.unpack_from(buf, offset)[0]
+            slot_hash, until = self.DATA.unpack_from(buf, offset + 8)
+            if not version & 1 and self.VERSION.unpack_from(buf, offset)[0] == version:
+                return slot_hash, until
+        # still moving (or a writer died mid-update): read it the slow way
+        with self.lock:
+            return self.DATA.unpack_from(buf, offset + 8)
+
+    def revoked_until(self, digest: bytes) -> Optional[float]:
+        """When the token's revocation lapses, None if it was never revoked."""
+        key_hash = self._key(digest)
+        start = key_hash % self.slots
+        for probe in range(self.MAX_PROBES):
+            slot_hash, until = self._read(((start + probe) % self.slots) * self.SLOT.size)
+            if slot_hash == key_hash:
+                return until
+            if slot_hash == 0:
+                return None
+        return None
+
+    def close(self):
+        self.lock.close()
+        self.shm.close()
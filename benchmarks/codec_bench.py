@@ -0,0 +1,110 @@
+"""
+JSON codec microbenchmark on payloads shaped like real gateway traffic.
+
+    python -m benchmarks.codec_bench
+
+Times loads/dumps for every installed backend of app.utils.codec on a
+ride's coordinate batch and a path search result, and prints the speedup
+over the stdlib backend.
+"""
+import os
+import random
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, Tuple
+
+os.environ.setdefault("USER_SERVICE_URL", "http://user-service")
+os.environ.setdefault("TRIP_SERVICE_URL", "http://trip-service")
+os.environ.setdefault("PATH_SERVICE_URL", "http://path-service")
+
+from app.utils import codec
+
+
+def trip_coordinates(points: int = 1800) -> Dict[str, Any]:
+    """A 30 minute ride sampled once a second, as posted to /trips/{id}/coordinates/batch."""
+    rng = random.Random(1)
+    lat, lng = 45.4642, 9.1900
+    coordinates = []
+    for second in range(points):
+        lat += rng.uniform(-0.00005, 0.00008)
+        lng += rng.uniform(-0.00005, 0.00008)
+        coordinates.append({
+            "latitude": round(lat, 7),
+            "longitude": round(lng, 7),
+            "altitude": round(rng.uniform(110, 130), 1),
+            "speed": round(rng.uniform(0, 9), 2),
+            "accuracy": round(rng.uniform(3, 12), 1),
+            "timestamp": f"2024-05-01T10:{second // 60 % 60:02d}:{second % 60:02d}Z",
+        })
+    return {"trip_id": "9b3f0a52-4c55-4b1e-9a5f-2f6c0e3d7a11", "coordinates": coordinates}
+
+
+def path_search(results: int = 50) -> Dict[str, Any]:
+    """A /paths/search page: paths with their segments, conditions and obstacle reports."""
+    rng = random.Random(2)
+    paths = []
+    for index in range(results):
+        segments = [
+            {
+                "start": {"latitude": rng.uniform(45.4, 45.5), "longitude": rng.uniform(9.1, 9.2)},
+                "end": {"latitude": rng.uniform(45.4, 45.5), "longitude": rng.uniform(9.1, 9.2)},
+                "status": rng.choice(["OPTIMAL", "MEDIUM", "SUFFICIENT", "REQUIRES_MAINTENANCE"]),
+                "obstacles": [
+                    {"type": rng.choice(["POTHOLE", "BUMP", "GRAVEL"]), "severity": rng.randint(1, 5), "confirmed": rng.random() > 0.5}
+                    for _ in range(rng.randint(0, 3))
+                ],
+            }
+            for _ in range(rng.randint(5, 20))
+        ]
+        paths.append({
+            "id": f"path-{index}",
+            "name": f"Via Ciclabile {index} – Naviglio",
+            "origin": "Milano Centrale",
+            "destination": "Darsena",
+            "distance_km": round(rng.uniform(1, 25), 2),
+            "score": round(rng.random(), 4),
+            "published": True,
+            "segments": segments,
+        })
+    return {"results": paths, "total": results, "page": 1}
+
+
+def measure(fn: Callable[[], Any], min_seconds: float = 0.3) -> float:
+    """Best per-call time in microseconds."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    while True:
+        runs = timer.repeat(repeat=5, number=number)
+        if min(runs) >= min_seconds / 5:
+            break
+        number *= 2
+    return min(runs) / number * 1e6
+
+
+def main() -> int:
+    backends: List[Tuple[str, Any, Any]] = []
+    for name in codec.CODECS:
+        try:
+            dumps, loads = codec._backend(name)
+        except ImportError:
+            continue
+        backends.append((name, dumps, loads))
+
+    payloads = {"trip coordinates": trip_coordinates(), "path search": path_search()}
+    print(f"active codec: {codec.CODEC_NAME}")
+    for label, payload in payloads.items():
+        encoded = codec._stdlib_dumps(payload)
+        print(f"\n{label} ({len(encoded) / 1024:.0f} KiB)")
+        print(f"  {'codec':<10}{'loads us':>12}{'dumps us':>12}{'speedup':>10}")
+        baseline = None
+        for name, dumps, loads in backends[::-1]:
+            load_us = measure(lambda: loads(encoded))
+            dump_us = measure(lambda: dumps(payload))
+            if baseline is None:
+                baseline = load_us + dump_us
+            print(f"  {name:<10}{load_us:>12.1f}{dump_us:>12.1f}{baseline / (load_us + dump_us):>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+End-to-end load generator: the whole gateway app in-process, upstreams stubbed.
+
+    python -m benchmarks.load [--scenario login|coordinates|search|all]
+                              [--concurrency 50] [--requests 2000]
+                              [--latency 0.005] [--jitter 0.01]
+                              [--error-rate 0.0] [--payload 50]
+                              [--json results.json]
+
+Scenarios mirror the traffic that matters in production: bursts of logins,
+trip coordinate uploads and path searches. Requests go through every
+middleware, auth, the rate limiter (raised out of the way unless
+RATE_LIMIT_PER_MINUTE is set), the proxy and the cache. Reports throughput
+and p50/p99/p99.9 latency per scenario.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+os.environ.setdefault("USER_SERVICE_URL", "http://user-service")
+os.environ.setdefault("TRIP_SERVICE_URL", "http://trip-service")
+os.environ.setdefault("PATH_SERVICE_URL", "http://path-service")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000000")
+os.environ.setdefault("HEALTH_CHECK_ENABLED", "false")
+
+import httpx
+
+from app.main import app
+from app.services.cache import response_cache
+from app.services.proxy import proxy
+from app.utils import codec
+from benchmarks import stubs
+from benchmarks.codec_bench import trip_coordinates
+
+# scenario -> builds (method, url, kwargs) for the n-th request
+Scenario = Callable[[int], Tuple[str, str, Dict[str, Any]]]
+
+
+def scenarios(token: str, payload: int) -> Dict[str, Scenario]:
+    auth = {"Authorization": f"Bearer {token}"}
+    upload = codec.dumps(trip_coordinates(payload))
+    return {
+        "login": lambda n: ("POST", "/api/auth/login", {
+            "content": codec.dumps({"email": f"rider{n % 500}@example.com", "password": "secret"}),
+            "headers": {"content-type": "application/json"},
+        }),
+        "coordinates": lambda n: ("POST", f"/api/trips/trip-{n % 200}/coordinates/batch", {
+            "content": upload,
+            "headers": {**auth, "content-type": "application/json"},
+        }),
+        # a few distinct queries, so the cache serves most of them like in production
+        "search": lambda n: ("GET", "/api/paths/search", {
+            "params": {"origin": "Milano Centrale", "destination": f"Darsena {n % 20}"},
+            "headers": {**auth, "accept-encoding": "gzip"},
+        }),
+    }
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def run(client: httpx.AsyncClient, scenario: Scenario, total: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = iter(range(total))
+
+    async def worker():
+        for n in next_index:
+            # cache hits never suspend in-process, so yield to keep workers taking turns
+            await asyncio.sleep(0)
+            method, url, kwargs = scenario(n)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "p999_ms": round(percentile(latencies, 0.999) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        "statuses": statuses,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    stubs.install(
+        proxy,
+        latency=args.latency,
+        jitter=args.jitter,
+        payload_size=args.payload,
+        error_rate=args.error_rate
+    )
+    available = scenarios(stubs.make_token(), args.payload)
+    selected = list(available) if args.scenario == "all" else [args.scenario]
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        for name in selected:
+            await response_cache.backend.clear()
+            results[name] = await run(client, available[name], args.requests, args.concurrency)
+    await proxy.close()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", default="all", choices=["all", "login", "coordinates", "search"])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.005, help="stub service latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random stub latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub calls failing with 503")
+    parser.add_argument("--payload", type=int, default=50, help="items in stub list payloads and uploads")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+
+    print(f"{'scenario':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'p99.9 ms':>10}  statuses")
+    for name, r in results.items():
+        print(f"{name:<14}{r['throughput_rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['p999_ms']:>10.2f}  {r['statuses']}")
+    if args.json:
+        with open(args.json, "wb") as f:
+            f.write(codec.dumps({"config": vars(args), "scenarios": results}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
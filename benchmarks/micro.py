@@ -0,0 +1,121 @@
+"""
+Microbenchmarks of the gateway's hot-path components.
+
+    python -m benchmarks.micro [--json results.json]
+
+Covers route matching, token verification (cached and uncached), the GCRA
+rate limiter, the circuit breaker, response building, response compression
+and a full ServiceProxy round trip against an in-process stub service.
+Every figure is the best per-call time in microseconds.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+os.environ.setdefault("USER_SERVICE_URL", "http://user-service")
+os.environ.setdefault("TRIP_SERVICE_URL", "http://trip-service")
+os.environ.setdefault("PATH_SERVICE_URL", "http://path-service")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000000")
+
+from starlette.requests import Request
+
+from app.middleware.rate_limit import limiter
+from app.routes.gateway import route_matcher
+from app.services.proxy import proxy
+from app.utils import codec
+from app.utils.auth import token_verifier
+from app.utils.circuit_breaker import circuit_breaker
+from app.utils.compression import AVAILABLE_ENCODINGS, compress
+from app.utils.response_helper import create_response_from_proxy
+from benchmarks import stubs
+from benchmarks.codec_bench import measure, path_search
+
+
+async def measure_async(fn: Callable[[], Awaitable[Any]], min_seconds: float = 0.3) -> float:
+    """measure() for coroutines, timed inside the running loop."""
+    number = 1
+    while True:
+        runs = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(number):
+                await fn()
+            runs.append(time.perf_counter() - started)
+        if min(runs) >= min_seconds / 5:
+            return min(runs) / number * 1e6
+        number *= 2
+
+
+def fake_request(path: str = "/api/paths/search", client: str = "10.0.0.1") -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [],
+        "query_string": b"",
+        "client": (client, 40000),
+    })
+
+
+def sync_benchmarks() -> Dict[str, float]:
+    token = stubs.make_token()
+    token_verifier.decode(token)
+    body = codec.dumps(path_search())
+    proxy_response = {"status_code": 200, "raw_content": body, "headers": {"content-type": "application/json"}}
+
+    results = {
+        "route_matcher.match": measure(lambda: route_matcher.match("POST", "/trips/9b3f0a52/coordinates/batch")),
+        "token_verifier.decode (cached)": measure(lambda: token_verifier.decode(token)),
+        "token_verifier.decode (uncached)": measure(lambda: (token_verifier.cache.clear(), token_verifier.decode(token))),
+        "circuit_breaker.can_execute": measure(lambda: circuit_breaker.can_execute("bench@stub")),
+        "circuit_breaker.record_success": measure(lambda: circuit_breaker.record_success("bench@stub", 0.01)),
+        "create_response_from_proxy": measure(lambda: create_response_from_proxy(proxy_response)),
+    }
+    for encoding in AVAILABLE_ENCODINGS:
+        results[f"compress {encoding} ({len(body) // 1024} KiB)"] = measure(lambda: compress(body, encoding))
+    return results
+
+
+async def async_benchmarks() -> Dict[str, float]:
+    stubs.install(proxy)
+    request = fake_request()
+    results = {
+        "limiter.check": await measure_async(lambda: limiter.check(request, "search")),
+        "proxy.forward_request": await measure_async(
+            lambda: proxy.forward_request("path-service", "/paths/search", "GET", headers={}, parse_json=False)
+        ),
+    }
+
+    async def streamed():
+        response = await proxy.stream_request("path-service", "/paths/search", "GET", headers={})
+        await response.aread()
+        await response.aclose()
+
+    results["proxy.stream_request"] = await measure_async(streamed)
+    await proxy.close()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = sync_benchmarks()
+    results.update(asyncio.run(async_benchmarks()))
+
+    print(f"{'benchmark':<44}{'us/call':>12}")
+    for name, micros in results.items():
+        print(f"{name:<44}{micros:>12.2f}")
+    if args.json:
+        with open(args.json, "wb") as f:
+            f.write(codec.dumps({"codec": codec.CODEC_NAME, "encodings": list(AVAILABLE_ENCODINGS), "us_per_call": results}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
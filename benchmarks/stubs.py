@@ -0,0 +1,100 @@
+"""
+In-process stand-ins for the user, trip and path services.
+
+Each stub answers the gateway's routes with realistic payloads after a
+configurable latency, and fails a configurable share of calls with a 503.
+install() points ServiceProxy at them through httpx.MockTransport, so
+benchmarks exercise the real proxy, breaker, load balancer and retry code
+without any network or real service.
+"""
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from jose import jwt
+
+from app.config.settings import settings
+from app.utils import codec
+from benchmarks.codec_bench import path_search, trip_coordinates
+
+SERVICES = ("user-service", "trip-service", "path-service")
+
+
+def make_token(subject: str = "bench-user", lifetime: int = 3600) -> str:
+    return jwt.encode(
+        {"sub": subject, "exp": int(time.time()) + lifetime},
+        settings.JWT_SECRET_KEY,
+        algorithm=settings.JWT_ALGORITHM
+    )
+
+
+class StubService:
+    """
+    latency: seconds before answering, jitter: extra uniform random delay,
+    payload_size: items in list responses (path search results, trip points),
+    error_rate: share of calls answered with a 503.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        payload_size: int = 50,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        # rendered once: the stub should cost as little as possible
+        self.search_body = codec.dumps(path_search(payload_size))
+        self.trip_body = codec.dumps(trip_coordinates(payload_size))
+
+    def _body(self, request: httpx.Request) -> Any:
+        path = request.url.path
+        if path == "/auth/login" or path == "/auth/register":
+            return {"access_token": make_token(), "token_type": "bearer"}
+        if path.startswith("/paths/search"):
+            return self.search_body
+        if path.endswith("/coordinates") or path.endswith("/coordinates/batch"):
+            return {"accepted": True}
+        if path.startswith("/trips/"):
+            return self.trip_body
+        return {"service": self.name, "path": path}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        await request.aread()
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return httpx.Response(
+                503,
+                stream=httpx.ByteStream(b'{"detail":"stub failure"}'),
+                headers={"content-type": "application/json"}
+            )
+
+        body = self._body(request)
+        content = body if isinstance(body, bytes) else codec.dumps(body)
+        return httpx.Response(
+            200,
+            stream=httpx.ByteStream(content),
+            headers={"content-type": "application/json", "content-length": str(len(content))}
+        )
+
+
+def install(proxy, overrides: Optional[Dict[str, Dict[str, Any]]] = None, **config: Any) -> Dict[str, StubService]:
+    """Route every upstream client of `proxy` to a stub; `overrides` tunes single services."""
+    stubs = {}
+    for index, name in enumerate(SERVICES):
+        options = {**config, **(overrides or {}).get(name, {})}
+        stubs[name] = StubService(name, seed=index, **options)
+        proxy.clients[name] = httpx.AsyncClient(transport=httpx.MockTransport(stubs[name]))
+    return stubs
@@ -0,0 +1,7 @@
+import os
+
+# settings are read at import time; point the services somewhere harmless
+os.environ.setdefault("USER_SERVICE_URL", "http://user-service")
+os.environ.setdefault("TRIP_SERVICE_URL", "http://trip-service")
+os.environ.setdefault("PATH_SERVICE_URL", "http://path-service")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
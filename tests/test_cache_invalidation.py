@@ -0,0 +1,53 @@
+import asyncio
+import time
+import httpx
+from jose import jwt
+from app.config.settings import settings
+from app.main import app
+from app.services.cache import invalidation_path, response_cache
+from app.services.proxy import proxy
+from app.utils import codec
+
+
+def bearer(subject: str) -> dict:
+    token = jwt.encode({"sub": subject, "exp": int(time.time()) + 600}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_invalidation_path_fills_params_and_subject():
+    assert invalidation_path("/trips/{trip_id}", {"trip_id": "t1"}, None) == "/trips/t1"
+    assert invalidation_path("/users/{subject}", {}, {"sub": "u1"}) == "/users/u1"
+    assert invalidation_path("/users/{subject}", {}, {"user_id": 7}) == "/users/7"
+
+
+def test_profile_update_invalidates_cached_user():
+    profiles = {"u1": {"id": "u1", "name": "old"}}
+
+    async def user_service(request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        if request.method == "PUT":
+            profiles["u1"] = {**profiles["u1"], **codec.loads(body)}
+            payload = profiles["u1"]
+        else:
+            payload = profiles[request.url.path.rsplit("/", 1)[-1]]
+        return httpx.Response(
+            200, stream=httpx.ByteStream(codec.dumps(payload)), headers={"content-type": "application/json"}
+        )
+
+    async def scenario():
+        await response_cache.backend.clear()
+        proxy.clients["user-service"] = httpx.AsyncClient(transport=httpx.MockTransport(user_service))
+        headers = bearer("u1")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gateway") as client:
+            first = await client.get("/api/users/u1", headers=headers)
+            cached = await client.get("/api/users/u1", headers=headers)
+            update = await client.put("/api/users/profile", headers=headers, json={"name": "new"})
+            after = await client.get("/api/users/u1", headers=headers)
+        return first, cached, update, after
+
+    first, cached, update, after = asyncio.run(scenario())
+    assert first.json()["name"] == "old"
+    assert cached.headers["x-cache"] == "HIT"
+    assert update.status_code == 200
+    assert after.headers["x-cache"] == "MISS"
+    assert after.json()["name"] == "new"